@@ -7,12 +7,28 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     app_env: str = "development"
     database_url: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout_seconds: float = 10
+    db_pool_recycle_seconds: int = 300
+    db_pool_pre_ping: bool = True
+    db_pool_use_lifo: bool = True
+    db_pgbouncer_mode: bool = False
     jwt_secret: str
     jwt_expires_minutes: int = 60 * 24 * 7
+    auth_cache_enabled: bool = True
+    auth_cache_ttl_seconds: float = 30
+    auth_cache_max_entries: int = 10000
     cors_origins: str = ""
     google_oauth_client_id: str = ""
     trusted_hosts: str = "localhost,127.0.0.1"
     auth_rate_limit_per_minute: int = 20
+    swipe_rate_limit_per_minute: int = 120
+    message_rate_limit_per_minute: int = 60
+    geocode_rate_limit_per_minute: int = 30
+    upload_rate_limit_per_minute: int = 10
+    rate_limit_backend: str = "memory"
+    rate_limit_max_keys: int = 100000
     public_base_url: str = ""
     oci_object_storage_namespace: str = ""
     oci_object_storage_bucket: str = ""
@@ -21,19 +37,70 @@ class Settings(BaseSettings):
     oci_auth_mode: str = "config_file"
     oci_config_profile: str = "DEFAULT"
     firebase_credentials_path: str = ""
+    notification_coalesce_seconds: int = 120
+    device_cache_ttl_seconds: float = 60
+    device_cache_max_entries: int = 10000
+    notification_retention_days: int = 90
+    notification_delivery_retention_days: int = 14
+    notification_purge_interval_seconds: float = 3600
+    notification_purge_batch_size: int = 1000
+    notification_purge_max_batches: int = 50
+    push_provider: str = "fcm"
+    push_dispatcher_enabled: bool = True
+    push_claim_limit: int = 500
+    push_batch_size: int = 100
+    push_concurrency: int = 4
+    push_poll_seconds: float = 1
+    push_max_attempts: int = 5
+    push_backoff_seconds: int = 15
+    push_max_backoff_seconds: int = 900
+    push_stuck_seconds: int = 300
     nominatim_user_agent: str = "Flinder/1.0"
     admin_emails: str = ""
     ai_text_api_base_url: str = ""
     ai_text_api_token: str = ""
-    ml_worker_url: str = ""
     ml_worker_token: str = ""
-    ml_worker_mode: str = "fastapi"
-    hf_token: str = ""
     worker_only: bool = False
     semantic_model_name: str = "all-MiniLM-L6-v2"
     semantic_matching_enabled: bool = True
+    semantic_encode_batch_size: int = 64
+    ml_llm_concurrency: int = 8
+    llm_traits_version: str = "1"
+    embedding_job_worker_enabled: bool = True
+    embedding_job_batch_size: int = 25
+    embedding_job_poll_seconds: float = 5
+    embedding_job_max_attempts: int = 5
+    embedding_job_backoff_seconds: int = 30
+    embedding_job_max_backoff_seconds: int = 3600
+    embedding_job_stuck_seconds: int = 900
+    embedding_job_retention_days: int = 7
+    embedding_compact_dtype: str = ""
+    embedding_compact_min_agreement: float = 0.95
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = 50000
+    embedding_cache_persist: bool = True
+    discovery_retrieval_mode: str = "ann"
+    discovery_hard_filters_enabled: bool = True
+    geo_backend: str = "haversine"
+    discovery_nearby_radius_km: float = 50
+    compatibility_candidates_enabled: bool = True
+    compatibility_top_n: int = 200
+    compatibility_block_size: int = 256
+    compatibility_max_age_hours: int = 48
+    pgvector_enabled: bool = False
+    candidate_index_path: str = ""
+    candidate_index_top_k: int = 300
+    candidate_index_nprobe: int = 8
+    candidate_index_sync_seconds: int = 30
+    candidate_index_snapshot_seconds: int = 300
+    swipe_learning_half_life_days: float = 0
+    deck_cache_enabled: bool = True
+    deck_cache_ttl_seconds: int = 60
+    deck_cache_max_cards: int = 20000
+    realtime_broker: str = "local"
+    realtime_database_url: str = ""
 
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8", extra="ignore")
 
     @property
     def cors_origin_list(self) -> list[str]:
@@ -1,9 +1,17 @@
-from collections.abc import Generator
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-from .config import get_settings
+from .config import Settings, get_settings
 
 
 class Base(DeclarativeBase):
@@ -16,8 +24,115 @@ def sqlalchemy_url(url: str) -> str:
     return url
 
 
-engine = create_engine(sqlalchemy_url(get_settings().database_url), pool_pre_ping=True)
+class PoolMetrics:
+    def __init__(self, sample_size: int = 1000) -> None:
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.waits: deque[float] = deque(maxlen=sample_size)
+        self.lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self.lock:
+            self.wait_count += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def count(self, field: str) -> None:
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "connect", lambda *_: self.count("connects"))
+        event.listen(engine, "checkout", lambda *_: self.count("checkouts"))
+        event.listen(engine, "checkin", lambda *_: self.count("checkins"))
+        event.listen(engine, "invalidate", lambda *_: self.count("invalidations"))
+        event.listen(engine, "soft_invalidate", lambda *_: self.count("soft_invalidations"))
+
+    def snapshot(self, pool: Any) -> dict[str, Any]:
+        with self.lock:
+            waits = sorted(self.waits)
+            data = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "softInvalidations": self.soft_invalidations,
+                "timeouts": self.timeouts,
+                "waitAvgMs": round(self.wait_total / self.wait_count * 1000, 3) if self.wait_count else 0.0,
+                "waitP95Ms": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 3) if waits else 0.0,
+                "waitMaxMs": round(self.wait_max * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            data.update(size=pool.size(), checkedOut=pool.checkedout(), checkedIn=pool.checkedin(), overflow=pool.overflow())
+        return data
+
+
+pool_metrics = {"sync": PoolMetrics(), "async": PoolMetrics()}
+
+
+class TimedCheckout:
+    metrics_name = ""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_metrics[self.metrics_name].record_wait(time.perf_counter() - started, timed_out)
+
+
+class MeteredQueuePool(TimedCheckout, QueuePool):
+    metrics_name = "sync"
+
+
+class MeteredAsyncQueuePool(TimedCheckout, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def engine_options(settings: Settings, poolclass: type[QueuePool]) -> dict[str, Any]:
+    options: dict[str, Any] = {
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout_seconds,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_use_lifo": settings.db_pool_use_lifo,
+    }
+    if settings.db_pgbouncer_mode:
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+engine = create_engine(sqlalchemy_url(get_settings().database_url), **engine_options(get_settings(), MeteredQueuePool))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+async_engine = create_async_engine(
+    sqlalchemy_url(get_settings().database_url), **engine_options(get_settings(), MeteredAsyncQueuePool)
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+pool_metrics["sync"].attach(engine)
+pool_metrics["async"].attach(async_engine.sync_engine)
+
+
+def pool_stats() -> dict[str, Any]:
+    return {
+        "sync": pool_metrics["sync"].snapshot(engine.pool),
+        "async": pool_metrics["async"].snapshot(async_engine.sync_engine.pool),
+    }
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -26,3 +141,8 @@ def get_db() -> Generator[Session, None, None]:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,33 +1,83 @@
+import uuid
+
 from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .config import get_settings
+from .database import get_async_db, get_db
 from .models import User
 from .security import decode_access_token
+from .services.principal_cache import Principal, principal_cache
 
 
-def get_current_user(
-    authorization: str | None = Header(default=None),
-    db: Session = Depends(get_db),
-) -> User:
+def token_payload(authorization: str | None) -> dict:
     if not authorization:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing authentication token")
 
     token = authorization.removeprefix("Bearer ").strip()
-    payload = decode_access_token(token)
-    if not payload or not payload.get("sub"):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+    cached = get_settings().auth_cache_enabled
+    payload = principal_cache.token(token) if cached else None
+    if payload is None:
+        payload = decode_access_token(token)
+        if not payload or not payload.get("sub"):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+        try:
+            payload["sub"] = str(uuid.UUID(payload["sub"]))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
+        if cached:
+            principal_cache.put_token(token, payload)
+    return payload
+
 
-    user = db.get(User, payload["sub"])
+def cached_principal(payload: dict) -> Principal | None:
+    return principal_cache.principal(uuid.UUID(payload["sub"])) if get_settings().auth_cache_enabled else None
+
+
+def remember_principal(user: User | None) -> Principal | None:
     if not user:
+        return None
+    principal = Principal.from_user(user)
+    if get_settings().auth_cache_enabled:
+        principal_cache.put_principal(principal)
+    return principal
+
+
+def require_active(principal: Principal | None, payload: dict) -> Principal:
+    if not principal or not principal.accepts(payload):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
-    if getattr(user, "account_status", "active") == "suspended":
+    if principal.account_status == "suspended":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Account is suspended")
+    return principal
+
 
+def get_principal(
+    authorization: str | None = Header(default=None),
+    db: Session = Depends(get_db),
+) -> Principal:
+    payload = token_payload(authorization)
+    principal = cached_principal(payload) or remember_principal(db.get(User, uuid.UUID(payload["sub"])))
+    return require_active(principal, payload)
+
+
+async def get_principal_async(
+    authorization: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_async_db),
+) -> Principal:
+    payload = token_payload(authorization)
+    principal = cached_principal(payload) or remember_principal(await db.get(User, uuid.UUID(payload["sub"])))
+    return require_active(principal, payload)
+
+
+def get_current_user(principal: Principal = Depends(get_principal), db: Session = Depends(get_db)) -> User:
+    user = db.get(User, principal.id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication token")
     return user
 
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
-    if getattr(current_user, "role", "user") != "admin":
+def require_admin(current_user: Principal = Depends(get_principal)) -> Principal:
+    if current_user.role != "admin":
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     return current_user
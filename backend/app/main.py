@@ -1,26 +1,61 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
-from .middleware import InMemoryRateLimitMiddleware, RequestContextMiddleware
+from .database import async_engine
+from .middleware import RateLimitMiddleware, RequestContextMiddleware
 from .routers import health, internal_ml
 
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stops = []
+    if settings.worker_only and settings.embedding_job_worker_enabled:
+        from .services.embedding_jobs import start_embedding_job_worker
+
+        stops.append(start_embedding_job_worker())
+    if not settings.worker_only and settings.push_dispatcher_enabled:
+        from .services.push_dispatch import push_provider_configured, start_push_dispatcher
+
+        if push_provider_configured():
+            stops.append(start_push_dispatcher())
+    if not settings.worker_only and settings.notification_purge_interval_seconds > 0:
+        from .services.notification_retention import start_notification_purger
+
+        stops.append(start_notification_purger())
+    if not settings.worker_only and settings.discovery_retrieval_mode in ("ann", "pgvector"):
+        from .database import SessionLocal
+        from .services.candidate_index import retrieval_mode, start_candidate_index_worker
+
+        with SessionLocal() as db:
+            if retrieval_mode(db) == "ann":
+                stops.append(start_candidate_index_worker())
+    yield
+    for stop in stops:
+        stop.set()
+    if not settings.worker_only:
+        from .services.realtime import manager
+
+        await manager.broker.stop()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title="Flinder ML Worker" if settings.worker_only else "Flinder API",
     version="1.0.0",
     docs_url=None if settings.is_production or settings.worker_only else "/docs",
     redoc_url=None if settings.is_production or settings.worker_only else "/redoc",
     openapi_url=None if settings.is_production or settings.worker_only else "/openapi.json",
+    lifespan=lifespan,
 )
 
 app.add_middleware(RequestContextMiddleware)
-app.add_middleware(
-    InMemoryRateLimitMiddleware,
-    auth_limit_per_minute=settings.auth_rate_limit_per_minute,
-)
+app.add_middleware(RateLimitMiddleware)
 
 if settings.is_production:
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.trusted_host_list)
@@ -37,7 +72,7 @@ app.include_router(internal_ml.router)
 app.include_router(health.router)
 
 if not settings.worker_only:
-    from .routers import admin, auth, conversations, devices, discovery, flats, location, notifications, preferences, profile, safety, swipes, users
+    from .routers import admin, auth, badges, conversations, devices, discovery, flats, location, notifications, preferences, profile, safety, swipes, users
 
     app.include_router(auth.router)
     app.include_router(profile.router)
@@ -47,6 +82,7 @@ if not settings.worker_only:
     app.include_router(users.router)
     app.include_router(flats.router)
     app.include_router(devices.router)
+    app.include_router(badges.router)
     app.include_router(notifications.router)
     app.include_router(safety.router)
     app.include_router(swipes.router)
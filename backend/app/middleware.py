@@ -1,45 +1,77 @@
+import json
+import logging
+import math
 import time
 import uuid
-from collections import defaultdict, deque
-from collections.abc import Callable
+from typing import Any
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from .security import decode_access_token
+from .services.principal_cache import principal_cache
+from .services.rate_limit import create_rate_limit_backend, match_rule, rate_limit_key, route_rules
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        request_id = request.headers.get("x-request-id", str(uuid.uuid4()))
+logger = logging.getLogger("flinder.rate_limit")
+
+
+def request_subject(authorization: str | None) -> str | None:
+    if not authorization:
+        return None
+    token = authorization.removeprefix("Bearer ").strip()
+    payload = principal_cache.peek_token(token) or decode_access_token(token)
+    return payload.get("sub") if payload else None
+
+
+class RequestContextMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = Headers(scope=scope).get("x-request-id", str(uuid.uuid4()))
         start_time = time.perf_counter()
-        response = await call_next(request)
-        elapsed_ms = round((time.perf_counter() - start_time) * 1000, 2)
-        response.headers["x-request-id"] = request_id
-        response.headers["x-response-time-ms"] = str(elapsed_ms)
-        response.headers["x-content-type-options"] = "nosniff"
-        response.headers["x-frame-options"] = "DENY"
-        response.headers["referrer-policy"] = "no-referrer"
-        return response
-
-
-class InMemoryRateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, auth_limit_per_minute: int):
-        super().__init__(app)
-        self.auth_limit_per_minute = auth_limit_per_minute
-        self.hits: dict[str, deque[float]] = defaultdict(deque)
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if request.url.path.startswith("/api/auth/"):
-            client_host = request.client.host if request.client else "unknown"
-            key = f"{client_host}:{request.url.path}"
-            now = time.time()
-            window = self.hits[key]
-            while window and now - window[0] > 60:
-                window.popleft()
-            if len(window) >= self.auth_limit_per_minute:
-                return Response(
-                    content='{"detail":"Too many authentication attempts"}',
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed_ms = round((time.perf_counter() - start_time) * 1000, 2)
+                headers = MutableHeaders(scope=message)
+                headers["x-request-id"] = request_id
+                headers["x-response-time-ms"] = str(elapsed_ms)
+                headers["x-content-type-options"] = "nosniff"
+                headers["x-frame-options"] = "DENY"
+                headers["referrer-policy"] = "no-referrer"
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, backend: Any | None = None, rules: list | None = None) -> None:
+        self.app = app
+        self.backend = backend or create_rate_limit_backend()
+        self.rules = route_rules() if rules is None else rules
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rule = match_rule(self.rules, scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if rule:
+            client_host = scope["client"][0] if scope.get("client") else "unknown"
+            subject = request_subject(Headers(scope=scope).get("authorization"))
+            try:
+                result = await self.backend.hit(rate_limit_key(rule, scope["path"], client_host, subject), rule)
+            except Exception:
+                logger.exception("Rate limit backend failed; allowing request")
+                result = None
+            if result and not result.allowed:
+                response = Response(
+                    content=json.dumps({"detail": rule.message}),
                     status_code=429,
                     media_type="application/json",
+                    headers={"retry-after": str(max(1, math.ceil(result.retry_after)))},
                 )
-            window.append(now)
-        return await call_next(request)
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
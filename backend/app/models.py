@@ -2,13 +2,47 @@ import uuid
 from datetime import date, datetime
 from typing import Any
 
-from sqlalchemy import Boolean, Date, DateTime, Float, ForeignKey, Integer, String, Text, func
+from sqlalchemy import Boolean, Date, DateTime, Float, ForeignKey, Integer, LargeBinary, String, Text, cast, func
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 from sqlalchemy.orm import Mapped, foreign, mapped_column, relationship
+from sqlalchemy.types import UserDefinedType
 
 from .database import Base
 
 
+class HalfVector(UserDefinedType):
+    cache_ok = True
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+
+    def get_col_spec(self, **kw) -> str:
+        return f"halfvec({self.dim})"
+
+    def bind_expression(self, bindvalue):
+        return cast(bindvalue, self)
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            return "[" + ",".join(str(float(item)) for item in value) + "]"
+
+        return process
+
+    def result_processor(self, dialect, coltype):
+        def process(value):
+            if value is None or not isinstance(value, str):
+                return value
+            return [float(item) for item in value.strip("[]").split(",") if item]
+
+        return process
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def max_inner_product(self, other):
+            return self.op("<#>", return_type=Float)(other)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -28,6 +62,7 @@ class User(Base):
     last_active: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     account_status: Mapped[str] = mapped_column(Text, default="active")
     role: Mapped[str] = mapped_column(Text, default="user")
+    sessions_valid_after: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     profile: Mapped["Profile | None"] = relationship(back_populates="user")
@@ -92,10 +127,15 @@ class UserEmbedding(Base):
     embedding_personality: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
     embedding_likes: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
     embedding_dislikes: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    embedding_combined: Mapped[list[float] | None] = mapped_column(HalfVector(2304), deferred=True)
+    embedding_packed: Mapped[bytes | None] = mapped_column(LargeBinary)
     model_name: Mapped[str | None] = mapped_column(Text)
     source_hash: Mapped[str | None] = mapped_column(Text)
     llm_traits: Mapped[dict[str, Any]] = mapped_column(JSONB, default=dict)
     canonical_text: Mapped[dict[str, Any]] = mapped_column(JSONB, default=dict)
+    llm_source_hash: Mapped[str | None] = mapped_column(Text)
+    llm_version: Mapped[str | None] = mapped_column(Text)
+    rebuild_reason: Mapped[str | None] = mapped_column(Text)
     status: Mapped[str] = mapped_column(Text, default="missing")
     error: Mapped[str | None] = mapped_column(Text)
     last_embedded_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
@@ -103,6 +143,79 @@ class UserEmbedding(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+class UserEmbeddingTombstone(Base):
+    __tablename__ = "user_embed_tombstones"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(primary_key=True)
+    deleted_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class CompatibilityCandidate(Base):
+    __tablename__ = "compatibility_candidates"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    candidate_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    city: Mapped[str] = mapped_column(Text, nullable=False)
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    semantic_score: Mapped[int] = mapped_column(Integer, default=0)
+    source_hash: Mapped[str | None] = mapped_column(Text)
+    computed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class CompatibilityJobState(Base):
+    __tablename__ = "compatibility_job_state"
+
+    city: Mapped[str] = mapped_column(Text, primary_key=True)
+    status: Mapped[str] = mapped_column(Text, default="running")
+    mode: Mapped[str] = mapped_column(Text, default="incremental")
+    cursor_user_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True))
+    pending_user_ids: Mapped[list[uuid.UUID] | None] = mapped_column(ARRAY(UUID(as_uuid=True)))
+    processed: Mapped[int] = mapped_column(Integer, default=0)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class EmbeddingJob(Base):
+    __tablename__ = "embedding_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
+    status: Mapped[str] = mapped_column(Text, default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    model_name: Mapped[str] = mapped_column(Text, primary_key=True)
+    text_hash: Mapped[str] = mapped_column(Text, primary_key=True)
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class SwipePreferenceState(Base):
+    __tablename__ = "swipe_preference_states"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    accumulator_hobbies: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    accumulator_interests: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    accumulator_traits: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    accumulator_personality: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    accumulator_likes: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    accumulator_dislikes: Mapped[list[float] | None] = mapped_column(ARRAY(Float))
+    like_count: Mapped[int] = mapped_column(Integer, default=0)
+    pass_count: Mapped[int] = mapped_column(Integer, default=0)
+    decayed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class Swipe(Base):
     __tablename__ = "swipes"
 
@@ -144,6 +257,7 @@ class ChatMember(Base):
     chat_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("chats.id"))
     user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"))
     joined_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    unread_count: Mapped[int] = mapped_column(Integer, default=0)
 
     chat: Mapped[Chat] = relationship(back_populates="members")
     user: Mapped[User] = relationship()
@@ -220,10 +334,20 @@ class Notification(Base):
     body: Mapped[str] = mapped_column(Text, nullable=False)
     data: Mapped[dict[str, Any]] = mapped_column(JSONB, default=dict)
     is_read: Mapped[bool] = mapped_column(Boolean, default=False)
+    coalesce_key: Mapped[str | None] = mapped_column(Text)
+    coalesced_count: Mapped[int] = mapped_column(Integer, default=1)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     expire_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
 
+class UserBadge(Base):
+    __tablename__ = "user_badges"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    unread_notifications: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class NotificationDelivery(Base):
     __tablename__ = "notification_deliveries"
 
@@ -234,6 +358,9 @@ class NotificationDelivery(Base):
     status: Mapped[str] = mapped_column(Text, default="pending")
     provider_message_id: Mapped[str | None] = mapped_column(Text)
     error: Mapped[str | None] = mapped_column(Text)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
 
@@ -319,3 +446,10 @@ class GeocodeCache(Base):
     provider: Mapped[str] = mapped_column(Text, default="nominatim")
     result: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    tat: Mapped[float] = mapped_column(Float, nullable=False)
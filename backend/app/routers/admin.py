@@ -6,21 +6,23 @@ from fastapi.responses import HTMLResponse
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, pool_stats
 from ..deps import require_admin
 from ..models import AdminAuditLog, Flat, FlatApplication, FlatReport, Match, Notification, User, UserReport
 from ..schemas import AdminResolveRequest
 from ..serializers import flat_report_to_client, user_report_to_client, user_to_client
+from ..services.notification_retention import purge_notifications, retention_metrics, table_estimates
+from ..services.principal_cache import Principal, principal_cache
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-def audit(db: Session, admin: User, action: str, target_type: str, target_id: uuid.UUID | None, metadata: dict):
+def audit(db: Session, admin: Principal, action: str, target_type: str, target_id: uuid.UUID | None, metadata: dict):
     db.add(AdminAuditLog(admin_id=admin.id, action=action, target_type=target_type, target_id=target_id, meta=metadata))
 
 
 @router.get("", response_class=HTMLResponse)
-def dashboard(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+def dashboard(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
     counts = {
         "users": db.scalar(select(func.count()).select_from(User)) or 0,
         "reports": db.scalar(select(func.count()).select_from(UserReport).where(UserReport.status == "open")) or 0,
@@ -45,7 +47,7 @@ def dashboard(_: User = Depends(require_admin), db: Session = Depends(get_db)):
 
 
 @router.get("/summary")
-def summary(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+def summary(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
     return {
         "users": db.scalar(select(func.count()).select_from(User)) or 0,
         "openUserReports": db.scalar(select(func.count()).select_from(UserReport).where(UserReport.status == "open")) or 0,
@@ -56,14 +58,38 @@ def summary(_: User = Depends(require_admin), db: Session = Depends(get_db)):
     }
 
 
+@router.get("/metrics/db-pool")
+def db_pool_metrics(_: Principal = Depends(require_admin)):
+    return {"success": True, "pools": pool_stats()}
+
+
+@router.get("/metrics/notification-retention")
+def notification_retention_metrics(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
+    return {"success": True, "purge": retention_metrics.snapshot(), "estimatedRows": table_estimates(db)}
+
+
+@router.post("/maintenance/notifications/purge")
+def purge_expired_notifications(admin: Principal = Depends(require_admin), db: Session = Depends(get_db)):
+    result = purge_notifications(db)
+    audit(db, admin, "purge_notifications", "notification", None, {"notifications": result.notifications, "deliveries": result.deliveries})
+    db.commit()
+    return {
+        "success": True,
+        "notificationsDeleted": result.notifications,
+        "deliveriesDeleted": result.deliveries,
+        "batches": result.batches,
+        "complete": result.complete,
+    }
+
+
 @router.get("/users")
-def list_users(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+def list_users(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
     users = db.scalars(select(User).order_by(User.created_at.desc()).limit(100)).all()
     return {"users": [user_to_client(user) for user in users]}
 
 
 @router.get("/reports/users")
-def list_user_reports(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+def list_user_reports(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
     reports = db.scalars(select(UserReport).order_by(UserReport.created_at.desc()).limit(100)).all()
     return {"reports": [user_report_to_client(report) for report in reports]}
 
@@ -72,7 +98,7 @@ def list_user_reports(_: User = Depends(require_admin), db: Session = Depends(ge
 def resolve_user_report(
     report_id: str,
     payload: AdminResolveRequest,
-    admin: User = Depends(require_admin),
+    admin: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     report = db.get(UserReport, uuid.UUID(report_id))
@@ -91,11 +117,13 @@ def resolve_user_report(
             user.account_status = "suspended"
     audit(db, admin, "resolve_user_report", "user_report", report.id, {"status": payload.status})
     db.commit()
+    if payload.suspendUser:
+        principal_cache.invalidate_user(report.reported_user_id)
     return {"success": True, "report": user_report_to_client(report)}
 
 
 @router.get("/reports/flats")
-def list_flat_reports(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+def list_flat_reports(_: Principal = Depends(require_admin), db: Session = Depends(get_db)):
     reports = db.scalars(select(FlatReport).order_by(FlatReport.created_at.desc()).limit(100)).all()
     return {"reports": [flat_report_to_client(report) for report in reports]}
 
@@ -104,7 +132,7 @@ def list_flat_reports(_: User = Depends(require_admin), db: Session = Depends(ge
 def resolve_flat_report(
     report_id: str,
     payload: AdminResolveRequest,
-    admin: User = Depends(require_admin),
+    admin: Principal = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     report = db.get(FlatReport, uuid.UUID(report_id))
@@ -8,10 +8,12 @@ from sqlalchemy.orm import Session
 
 from ..config import get_settings
 from ..database import get_db
+from ..deps import get_principal
 from ..models import User
 from ..schemas import GoogleAuthRequest, LoginRequest, RegisterRequest
 from ..security import create_access_token, hash_password, verify_password
 from ..serializers import user_to_client
+from ..services.principal_cache import Principal, principal_cache
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -118,6 +120,17 @@ def google_login(payload: GoogleAuthRequest, db: Session = Depends(get_db)):
 
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate_user(user.id)
 
     token = create_access_token(str(user.id), {"email": user.email, "name": user.name})
     return {"success": True, "message": "Google login successful", "token": token, "user": user_to_client(user)}
+
+
+@router.post("/logout")
+def logout(current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
+    user = db.get(User, current_user.id)
+    user.sessions_valid_after = datetime.now(timezone.utc)
+    user.online_status = "offline"
+    db.commit()
+    principal_cache.invalidate_user(current_user.id)
+    return {"success": True, "message": "Logged out"}
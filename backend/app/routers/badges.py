@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import get_async_db
+from ..deps import get_principal_async
+from ..services.badges import badges_statement
+from ..services.principal_cache import Principal
+
+router = APIRouter(prefix="/api/badges", tags=["badges"])
+
+
+@router.get("")
+async def get_badges(current_user: Principal = Depends(get_principal_async), db: AsyncSession = Depends(get_async_db)):
+    notifications, messages, conversations = (await db.execute(badges_statement(current_user.id))).one()
+    return {
+        "success": True,
+        "notifications": notifications or 0,
+        "messages": messages or 0,
+        "conversations": conversations or 0,
+    }
@@ -3,15 +3,18 @@ from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 
-from ..database import SessionLocal, get_db
-from ..deps import get_current_user
+from ..database import AsyncSessionLocal, get_async_db, get_db
+from ..deps import get_principal, get_principal_async
 from ..models import Chat, ChatMember, Message, User, UserBlock
 from ..schemas import CreateConversationRequest, ReadMessagesRequest, SendMessageRequest
 from ..security import decode_access_token
 from ..serializers import chat_to_client, message_to_client
-from ..services.notifications import create_notification
+from ..services.badges import chat_message_sent_statement, chat_messages_read_statement
+from ..services.notifications import NotificationSpec, create_notifications
+from ..services.principal_cache import Principal
 from ..services.realtime import manager
 
 router = APIRouter(prefix="/api/conversations", tags=["conversations"])
@@ -24,12 +27,11 @@ def parse_uuid(value: str, field: str = "id") -> uuid.UUID:
         raise HTTPException(status_code=400, detail=f"Invalid {field}")
 
 
-def require_chat_member(chat_id: uuid.UUID, user_id: uuid.UUID, db: Session) -> Chat:
-    chat = db.scalar(
-        select(Chat)
-        .options(selectinload(Chat.members).selectinload(ChatMember.user))
-        .where(Chat.id == chat_id)
-    )
+def chat_with_members(chat_id: uuid.UUID):
+    return select(Chat).options(selectinload(Chat.members).selectinload(ChatMember.user)).where(Chat.id == chat_id)
+
+
+def check_chat_member(chat: Chat | None, user_id: uuid.UUID) -> Chat:
     if not chat:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -40,8 +42,16 @@ def require_chat_member(chat_id: uuid.UUID, user_id: uuid.UUID, db: Session) ->
     return chat
 
 
-def get_last_message(chat_id: uuid.UUID, db: Session) -> Message | None:
-    return db.scalar(
+def require_chat_member(chat_id: uuid.UUID, user_id: uuid.UUID, db: Session) -> Chat:
+    return check_chat_member(db.scalar(chat_with_members(chat_id)), user_id)
+
+
+async def require_chat_member_async(chat_id: uuid.UUID, user_id: uuid.UUID, db: AsyncSession) -> Chat:
+    return check_chat_member(await db.scalar(chat_with_members(chat_id)), user_id)
+
+
+def last_message_query(chat_id: uuid.UUID):
+    return (
         select(Message)
         .where(Message.chat_id == chat_id, Message.is_deleted.is_(False))
         .order_by(Message.sent_at.desc())
@@ -49,18 +59,24 @@ def get_last_message(chat_id: uuid.UUID, db: Session) -> Message | None:
     )
 
 
+def get_last_message(chat_id: uuid.UUID, db: Session) -> Message | None:
+    return db.scalar(last_message_query(chat_id))
+
+
 @router.get("")
-def list_conversations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    chats = db.scalars(
-        select(Chat)
-        .join(ChatMember, ChatMember.chat_id == Chat.id)
-        .options(selectinload(Chat.members).selectinload(ChatMember.user))
-        .where(ChatMember.user_id == current_user.id)
-        .order_by(Chat.updated_at.desc())
+async def list_conversations(current_user: Principal = Depends(get_principal_async), db: AsyncSession = Depends(get_async_db)):
+    chats = (
+        await db.scalars(
+            select(Chat)
+            .join(ChatMember, ChatMember.chat_id == Chat.id)
+            .options(selectinload(Chat.members).selectinload(ChatMember.user))
+            .where(ChatMember.user_id == current_user.id)
+            .order_by(Chat.updated_at.desc())
+        )
     ).all()
 
     conversations = [
-        chat_to_client(chat, get_last_message(chat.id, db))
+        chat_to_client(chat, await db.scalar(last_message_query(chat.id)), current_user.id)
         for chat in chats
     ]
     return {"conversations": conversations}
@@ -69,7 +85,7 @@ def list_conversations(current_user: User = Depends(get_current_user), db: Sessi
 @router.post("", status_code=201)
 def create_conversation(
     payload: CreateConversationRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_principal),
     db: Session = Depends(get_db),
 ):
     member_ids = {parse_uuid(member_id, "memberId") for member_id in payload.memberIds}
@@ -103,7 +119,7 @@ def create_conversation(
             .limit(1)
         )
         if existing_chat:
-            return {"conversation": chat_to_client(existing_chat, get_last_message(existing_chat.id, db))}
+            return {"conversation": chat_to_client(existing_chat, get_last_message(existing_chat.id, db), current_user.id)}
 
     chat = Chat(
         name=payload.name if payload.isGroup else payload.name,
@@ -120,23 +136,25 @@ def create_conversation(
     db.commit()
     db.refresh(chat)
     chat = require_chat_member(chat.id, current_user.id, db)
-    return {"conversation": chat_to_client(chat)}
+    return {"conversation": chat_to_client(chat, viewer_id=current_user.id)}
 
 
 @router.get("/{conversation_id}/messages")
-def list_messages(
+async def list_messages(
     conversation_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     chat_id = parse_uuid(conversation_id, "conversation_id")
-    require_chat_member(chat_id, current_user.id, db)
-
-    messages = db.scalars(
-        select(Message)
-        .where(Message.chat_id == chat_id, Message.is_deleted.is_(False))
-        .order_by(Message.sent_at.asc())
-        .limit(100)
+    await require_chat_member_async(chat_id, current_user.id, db)
+
+    messages = (
+        await db.scalars(
+            select(Message)
+            .where(Message.chat_id == chat_id, Message.is_deleted.is_(False))
+            .order_by(Message.sent_at.asc())
+            .limit(100)
+        )
     ).all()
     return {"messages": [message_to_client(message) for message in messages]}
 
@@ -145,11 +163,11 @@ def list_messages(
 async def send_message(
     conversation_id: str,
     payload: SendMessageRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     chat_id = parse_uuid(conversation_id, "conversation_id")
-    chat = require_chat_member(chat_id, current_user.id, db)
+    chat = await require_chat_member_async(chat_id, current_user.id, db)
 
     message = Message(
         chat_id=chat_id,
@@ -160,18 +178,25 @@ async def send_message(
     )
     chat.updated_at = datetime.now(timezone.utc)
     db.add(message)
-    for member in chat.members:
-        if member.user_id != current_user.id:
-            create_notification(
-                db,
-                member.user_id,
-                "message",
-                f"New message from {current_user.name}",
-                payload.content[:120],
-                {"conversationId": str(chat_id), "senderId": str(current_user.id)},
-            )
-    db.commit()
-    db.refresh(message)
+    digest_title = f"{{count}} new messages in {chat.name}" if chat.is_group and chat.name else f"{{count}} new messages from {current_user.name}"
+    specs = [
+        NotificationSpec(
+            member.user_id,
+            "message",
+            f"New message from {current_user.name}",
+            payload.content[:120],
+            {"conversationId": str(chat_id), "senderId": str(current_user.id)},
+            send_push=not manager.is_connected(chat_id, member.user_id),
+            coalesce_key=f"conversation:{chat_id}",
+            digest_title=digest_title,
+        )
+        for member in chat.members
+        if member.user_id != current_user.id
+    ]
+    await db.execute(chat_message_sent_statement(chat_id, current_user.id))
+    await db.run_sync(create_notifications, specs)
+    await db.commit()
+    await db.refresh(message)
     payload_data = message_to_client(message)
     await manager.broadcast(chat_id, {"type": "message", "message": payload_data})
 
@@ -182,25 +207,24 @@ async def send_message(
 async def mark_messages_read(
     conversation_id: str,
     payload: ReadMessagesRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     chat_id = parse_uuid(conversation_id, "conversation_id")
-    require_chat_member(chat_id, current_user.id, db)
+    chat = await require_chat_member_async(chat_id, current_user.id, db)
     ids = [uuid.UUID(message_id) for message_id in payload.messageIds]
     if ids:
-        messages = db.scalars(
-            select(Message).where(Message.chat_id == chat_id, Message.id.in_(ids), Message.sender_id != current_user.id)
-        ).all()
+        query = select(Message).where(Message.chat_id == chat_id, Message.id.in_(ids), Message.sender_id != current_user.id)
     else:
-        messages = db.scalars(
-            select(Message).where(Message.chat_id == chat_id, Message.sender_id != current_user.id, Message.is_read.is_(False))
-        ).all()
+        query = select(Message).where(Message.chat_id == chat_id, Message.sender_id != current_user.id, Message.is_read.is_(False))
+    messages = (await db.scalars(query)).all()
+    released = len(messages) if chat.is_group else sum(1 for message in messages if not message.is_read)
     now = datetime.now(timezone.utc)
     for message in messages:
         message.is_read = True
         message.read_at = now
-    db.commit()
+    await db.execute(chat_messages_read_statement(chat_id, current_user.id, released if ids else None))
+    await db.commit()
     await manager.broadcast(chat_id, {"type": "messages_read", "readerId": str(current_user.id), "messageIds": [str(m.id) for m in messages]})
     return {"success": True, "messageIds": [str(m.id) for m in messages]}
 
@@ -212,17 +236,17 @@ async def conversation_websocket(websocket: WebSocket, conversation_id: str, tok
         await websocket.close(code=4401)
         return
     chat_id = parse_uuid(conversation_id, "conversation_id")
-    with SessionLocal() as db:
-        user = db.get(User, payload["sub"])
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, payload["sub"])
         if not user:
             await websocket.close(code=4401)
             return
         try:
-            require_chat_member(chat_id, user.id, db)
+            await require_chat_member_async(chat_id, user.id, db)
         except HTTPException:
             await websocket.close(code=4403)
             return
-    await manager.connect(chat_id, websocket)
+    await manager.connect(chat_id, websocket, user.id)
     await manager.broadcast(chat_id, {"type": "presence", "userId": payload["sub"], "status": "online"})
     try:
         while True:
@@ -230,5 +254,5 @@ async def conversation_websocket(websocket: WebSocket, conversation_id: str, tok
             if event.get("type") == "typing":
                 await manager.broadcast(chat_id, {"type": "typing", "userId": payload["sub"], "isTyping": bool(event.get("isTyping"))})
     except WebSocketDisconnect:
-        manager.disconnect(chat_id, websocket)
+        await manager.disconnect(chat_id, websocket)
         await manager.broadcast(chat_id, {"type": "presence", "userId": payload["sub"], "status": "offline"})
@@ -5,16 +5,18 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..deps import get_current_user
-from ..models import DeviceInfo, User
+from ..deps import get_principal
+from ..models import DeviceInfo
 from ..schemas import DeviceRequest
 from ..serializers import device_to_client
+from ..services.device_cache import device_cache
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/devices", tags=["devices"])
 
 
 @router.post("")
-def register_device(payload: DeviceRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def register_device(payload: DeviceRequest, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     if payload.platform not in {"ios", "android", "web"}:
         raise HTTPException(status_code=400, detail="Unsupported platform")
     device = db.scalar(
@@ -28,4 +30,5 @@ def register_device(payload: DeviceRequest, current_user: User = Depends(get_cur
     db.add(device)
     db.commit()
     db.refresh(device)
+    device_cache.refresh(db, current_user.id)
     return {"success": True, "device": device_to_client(device)}
@@ -1,40 +1,122 @@
 import uuid
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 
-from ..database import get_db
-from ..deps import get_current_user
-from ..models import Boost, Match, Profile, Swipe, SwipeRewind, User, UserBlock, UserEmbedding
+from ..config import get_settings
+from ..database import SessionLocal, get_async_db, get_db
+from ..deps import get_principal, get_principal_async
+from ..models import Boost, Match, Preference, Profile, Swipe, SwipeRewind, User, UserBlock, UserEmbedding
 from ..schemas import SwipeRequest
 from ..serializers import profile_to_client
-from ..services.discovery import score_profile
-from ..services.notifications import create_notification
-from ..services.semantic_matching import semantic_similarity
-from ..services.swipe_learning import build_swipe_preference_model, swipe_learning_score
+from ..services.candidate_index import nearest_candidate_ids, pgvector_candidate_ids, retrieval_mode
+from ..services.compatibility import precomputed_candidate_ids
+from ..services.deck_cache import cached_deck, card_key, decode_cursor, deck_cache, encode_cursor
+from ..services.discovery import BOOST_POINTS, hard_filter_predicates, prefilter_score, score_profile
+from ..services.geo import distance_km, haversine_km, within_radius
+from ..services.notifications import NotificationSpec, create_notifications
+from ..services.principal_cache import Principal
+from ..services.semantic_matching import embedding_load_options, semantic_similarity_batch
+from ..services.swipe_learning import (
+    load_swipe_preference_model,
+    record_swipe_signal,
+    retract_swipe_signal,
+    swipe_learning_score,
+)
 
 router = APIRouter(prefix="/api/discover", tags=["discovery"])
 
 
-@router.get("")
-def discover(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    current_profile = db.get(Profile, current_user.id)
-    if not current_profile or getattr(current_profile, "completion_score", 0) < 70:
-        raise HTTPException(status_code=403, detail="Complete your profile before discovering matches")
-    swiped_targets = select(Swipe.target_user_id).where(Swipe.user_id == current_user.id)
-    blocked_users = select(UserBlock.blocked_id).where(UserBlock.blocker_id == current_user.id)
-    blocked_by = select(UserBlock.blocker_id).where(UserBlock.blocked_id == current_user.id)
-    profiles = db.scalars(
+DISCOVERY_POOL_SIZE = 100
+DISCOVERY_MAX_POOL_SIZE = 500
+DISCOVERY_PAGE_SIZE = 25
+
+
+def eligible_profiles_query(current_user_id: uuid.UUID, filters: list | None = None):
+    swiped_targets = select(Swipe.target_user_id).where(Swipe.user_id == current_user_id)
+    blocked_users = select(UserBlock.blocked_id).where(UserBlock.blocker_id == current_user_id)
+    blocked_by = select(UserBlock.blocker_id).where(UserBlock.blocked_id == current_user_id)
+    return (
         select(Profile)
+        .join(User, User.id == Profile.user_id)
         .options(selectinload(Profile.user), selectinload(Profile.pictures))
-        .where(Profile.user_id != current_user.id)
+        .where(Profile.user_id != current_user_id)
         .where(Profile.user_id.not_in(swiped_targets))
         .where(Profile.user_id.not_in(blocked_users))
         .where(Profile.user_id.not_in(blocked_by))
-        .limit(100)
-    ).all()
+        .where(*(filters or []))
+    )
+
+
+def retrieve_candidate_profiles(
+    db: Session,
+    current_user: Principal,
+    current_profile: Profile,
+    current_embedding: UserEmbedding | None,
+    exclude: set[uuid.UUID] | None = None,
+    pool_size: int = DISCOVERY_POOL_SIZE,
+) -> list[Profile]:
+    filters = []
+    if get_settings().discovery_hard_filters_enabled:
+        preference = db.scalar(select(Preference).where(Preference.user_id == current_user.id))
+        filters = hard_filter_predicates(current_user, current_profile, preference)
+    query = eligible_profiles_query(current_user.id, filters)
+    if exclude:
+        query = query.where(Profile.user_id.not_in(list(exclude)))
+    profiles: list[Profile] = []
+    mode = retrieval_mode(db)
+    ranked_ids: list[uuid.UUID] = []
+    if get_settings().compatibility_candidates_enabled:
+        ranked_ids = precomputed_candidate_ids(db, current_user.id, get_settings().compatibility_top_n)
+    if not ranked_ids and mode == "ann":
+        ranked_ids = nearest_candidate_ids(current_embedding, exclude={current_user.id})
+    elif not ranked_ids and mode == "pgvector":
+        ranked_ids = pgvector_candidate_ids(db, current_embedding, exclude={current_user.id})
+    if ranked_ids:
+        rank = {user_id: position for position, user_id in enumerate(ranked_ids)}
+        rows = db.scalars(query.where(Profile.user_id.in_(ranked_ids))).all()
+        profiles = sorted(rows, key=lambda profile: rank[profile.user_id])[:pool_size]
+    if len(profiles) < pool_size:
+        if profiles:
+            query = query.where(Profile.user_id.not_in([profile.user_id for profile in profiles]))
+        query = query.order_by(prefilter_score(current_profile).desc(), User.last_active.desc().nulls_last())
+        profiles.extend(db.scalars(query.limit(pool_size - len(profiles))).all())
+    return profiles
+
+
+def nearby_candidate_profiles(
+    db: Session,
+    current_user: Principal,
+    current_profile: Profile,
+    radius_km: float | None,
+    sort: str,
+) -> list[Profile]:
+    latitude, longitude = current_profile.latitude, current_profile.longitude
+    default_radius = get_settings().discovery_nearby_radius_km
+    if get_settings().discovery_hard_filters_enabled:
+        preference = db.scalar(select(Preference).where(Preference.user_id == current_user.id))
+        filters = hard_filter_predicates(current_user, current_profile, preference, radius_km, default_radius)
+    else:
+        filters = within_radius(Profile.latitude, Profile.longitude, latitude, longitude, radius_km or default_radius)
+    query = eligible_profiles_query(current_user.id, filters).where(Profile.latitude.is_not(None), Profile.longitude.is_not(None))
+    if sort == "distance":
+        query = query.order_by(distance_km(Profile.latitude, Profile.longitude, latitude, longitude))
+    else:
+        query = query.order_by(prefilter_score(current_profile).desc(), User.last_active.desc().nulls_last())
+    return list(db.scalars(query.limit(DISCOVERY_POOL_SIZE)).all())
+
+
+def score_candidates(
+    db: Session,
+    current_user_id: uuid.UUID,
+    current_profile: Profile,
+    current_embedding: UserEmbedding | None,
+    profiles: list[Profile],
+) -> list[dict]:
     active_boosts = {
         row.user_id
         for row in db.scalars(
@@ -42,16 +124,21 @@ def discover(current_user: User = Depends(get_current_user), db: Session = Depen
         ).all()
     }
     embedding_rows = db.scalars(
-        select(UserEmbedding).where(UserEmbedding.user_id.in_([current_user.id, *[profile.user_id for profile in profiles]]))
+        select(UserEmbedding)
+        .where(UserEmbedding.user_id.in_([profile.user_id for profile in profiles]))
+        .options(*embedding_load_options())
     ).all()
     embeddings = {row.user_id: row for row in embedding_rows}
-    swipe_model = build_swipe_preference_model(db, current_user.id)
+    swipe_model = load_swipe_preference_model(db, current_user_id)
+    semantic_scores = semantic_similarity_batch(
+        current_embedding,
+        [embeddings.get(profile.user_id) for profile in profiles],
+    )
     scored = []
-    for profile in profiles:
-        semantic = semantic_similarity(embeddings.get(current_user.id), embeddings.get(profile.user_id))
+    for profile, semantic in zip(profiles, semantic_scores):
         learned = swipe_learning_score(swipe_model, embeddings.get(profile.user_id))
         scoring = score_profile(current_profile, profile, profile.user, semantic, learned)
-        boost = 30 if profile.user_id in active_boosts else 0
+        boost = BOOST_POINTS if profile.user_id in active_boosts else 0
         data = profile_to_client(profile, profile.user)
         data["compatibility"] = {
             "score": scoring["score"] + boost,
@@ -69,25 +156,133 @@ def discover(current_user: User = Depends(get_current_user), db: Session = Depen
             },
         }
         scored.append(data)
-    scored.sort(key=lambda item: item["compatibility"]["score"], reverse=True)
-    return {"success": True, "profiles": scored[:25]}
+    scored.sort(key=card_key)
+    return scored
+
+
+def build_deck(
+    current_user: Principal,
+    exclude: set[uuid.UUID] | None = None,
+    pool_size: int = DISCOVERY_POOL_SIZE,
+) -> tuple[list[dict], bool]:
+    with SessionLocal() as db:
+        current_profile = db.get(Profile, current_user.id)
+        current_embedding = db.get(UserEmbedding, current_user.id, options=embedding_load_options())
+        profiles = retrieve_candidate_profiles(db, current_user, current_profile, current_embedding, exclude, pool_size)
+        scored = score_candidates(db, current_user.id, current_profile, current_embedding, profiles)
+    return scored, len(profiles) < pool_size
+
+
+def build_nearby_deck(current_user: Principal, radius_km: float | None, sort: str) -> list[dict]:
+    with SessionLocal() as db:
+        current_profile = db.get(Profile, current_user.id)
+        current_embedding = db.get(UserEmbedding, current_user.id, options=embedding_load_options())
+        profiles = nearby_candidate_profiles(db, current_user, current_profile, radius_km, sort)
+        scored = score_candidates(db, current_user.id, current_profile, current_embedding, profiles)
+    distances = {
+        str(profile.user_id): round(
+            haversine_km(current_profile.latitude, current_profile.longitude, profile.latitude, profile.longitude), 2
+        )
+        for profile in profiles
+    }
+    for card in scored:
+        card["distanceKm"] = distances.get(card["userId"])
+    if sort == "distance":
+        scored.sort(key=lambda card: card["distanceKm"])
+    return scored
+
+
+def update_swipe_learning(apply_signal, *args) -> None:
+    with SessionLocal() as db:
+        apply_signal(db, *args)
+        db.commit()
+
+
+def discovery_page(page: list[dict], exhausted: bool, built_at: datetime | None, served: int) -> dict:
+    return {
+        "success": True,
+        "profiles": page,
+        "nextCursor": encode_cursor(page[-1], built_at, served) if page and not exhausted else None,
+    }
+
+
+@router.get("")
+async def discover(
+    cursor: str | None = None,
+    limit: int = Query(DISCOVERY_PAGE_SIZE, ge=1, le=50),
+    radiusKm: float | None = Query(None, gt=0, le=500),
+    sort: str = Query("score", pattern="^(score|distance)$"),
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    after = position.after if position else None
+    served = position.served if position else 0
+    current_profile = await db.get(Profile, current_user.id)
+    if not current_profile or getattr(current_profile, "completion_score", 0) < 70:
+        raise HTTPException(status_code=403, detail="Complete your profile before discovering matches")
+    nearby = radiusKm is not None or sort == "distance"
+    deck = None if nearby else await db.run_sync(cached_deck, current_user.id)
+    page: list[dict] = []
+    if deck:
+        page = deck_cache.page(deck, limit, after, deck.pinned(position))
+        if deck.complete or len(page) == limit:
+            return discovery_page(page, deck.complete and len(page) < limit, deck.built_at, served + len(page))
+    if nearby:
+        if current_profile.latitude is None or current_profile.longitude is None:
+            raise HTTPException(status_code=400, detail="Set your location to search nearby")
+        scored = await run_in_threadpool(build_nearby_deck, current_user, radiusKm, sort)
+        return {"success": True, "profiles": scored[:limit], "nextCursor": None}
+    if deck:
+        scored, complete = await run_in_threadpool(build_deck, current_user, set(deck.seen))
+        deck_cache.extend(current_user.id, deck, scored, complete)
+        page += deck_cache.page(deck, limit - len(page), after, deck.pinned(position), restart=False)
+        return discovery_page(page, complete and len(page) < limit, deck.built_at, served + len(page))
+    built_at = datetime.now(timezone.utc)
+    pool_size = min(DISCOVERY_MAX_POOL_SIZE, max(DISCOVERY_POOL_SIZE, served + limit))
+    scored, complete = await run_in_threadpool(build_deck, current_user, None, pool_size)
+    if get_settings().deck_cache_enabled:
+        deck = deck_cache.put(current_user.id, scored, built_at, complete=complete)
+        page = deck_cache.page(deck, limit, after)
+    else:
+        built_at = None
+        page = [card for card in scored if after is None or card_key(card) > after][:limit]
+    return discovery_page(page, complete and len(page) < limit, built_at, served + len(page))
+
+
+def notify_match(db: Session, current_user: Principal, target_id: uuid.UUID) -> None:
+    create_notifications(
+        db,
+        [
+            NotificationSpec(target_id, "match", "New match", f"You matched with {current_user.name}", {"userId": str(current_user.id)}),
+            NotificationSpec(current_user.id, "match", "New match", "You have a new match", {"userId": str(target_id)}),
+        ],
+    )
 
 
 @router.post("/swipe")
-def swipe(payload: SwipeRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def swipe(
+    payload: SwipeRequest,
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
+):
     target_id = uuid.UUID(payload.targetUserId)
     if target_id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot swipe yourself")
-    if db.scalar(select(UserBlock).where(or_(
+    if await db.scalar(select(UserBlock).where(or_(
         and_(UserBlock.blocker_id == current_user.id, UserBlock.blocked_id == target_id),
         and_(UserBlock.blocker_id == target_id, UserBlock.blocked_id == current_user.id),
     ))):
         raise HTTPException(status_code=403, detail="You cannot interact with this user")
     action = "like" if payload.action == "like" else "pass"
 
-    existing = db.scalar(
+    existing = await db.scalar(
         select(Swipe).where(Swipe.user_id == current_user.id, Swipe.target_user_id == target_id)
     )
+    previous_action = existing.action if existing else None
     if existing:
         existing.action = action
     else:
@@ -95,7 +290,7 @@ def swipe(payload: SwipeRequest, current_user: User = Depends(get_current_user),
         db.add(existing)
 
     if action == "like":
-        reciprocal = db.scalar(
+        reciprocal = await db.scalar(
             select(Swipe).where(
                 Swipe.user_id == target_id,
                 Swipe.target_user_id == current_user.id,
@@ -104,7 +299,7 @@ def swipe(payload: SwipeRequest, current_user: User = Depends(get_current_user),
         )
         if reciprocal:
             first, second = sorted([current_user.id, target_id], key=str)
-            match = db.scalar(
+            match = await db.scalar(
                 select(Match).where(
                     or_(
                         and_(Match.user_id_1 == first, Match.user_id_2 == second),
@@ -114,30 +309,19 @@ def swipe(payload: SwipeRequest, current_user: User = Depends(get_current_user),
             )
             if not match:
                 db.add(Match(user_id_1=first, user_id_2=second))
-                create_notification(
-                    db,
-                    target_id,
-                    "match",
-                    "New match",
-                    f"You matched with {current_user.name}",
-                    {"userId": str(current_user.id)},
-                )
-                create_notification(
-                    db,
-                    current_user.id,
-                    "match",
-                    "New match",
-                    "You have a new match",
-                    {"userId": str(target_id)},
-                )
+                await db.run_sync(notify_match, current_user, target_id)
 
-    db.commit()
+    await db.commit()
+    deck_cache.discard_card(current_user.id, target_id)
+    await run_in_threadpool(
+        update_swipe_learning, record_swipe_signal, current_user.id, target_id, action, previous_action
+    )
     return {"success": True, "message": "Swipe recorded"}
 
 
 @router.post("/swipe/rewind")
-def rewind_swipe(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    swipe = db.scalar(
+async def rewind_swipe(current_user: Principal = Depends(get_principal_async), db: AsyncSession = Depends(get_async_db)):
+    swipe = await db.scalar(
         select(Swipe)
         .where(Swipe.user_id == current_user.id)
         .order_by(Swipe.created_at.desc())
@@ -148,13 +332,15 @@ def rewind_swipe(current_user: User = Depends(get_current_user), db: Session = D
     rewind = SwipeRewind(user_id=current_user.id, swipe_id=swipe.id, target_user_id=swipe.target_user_id)
     target_user_id = swipe.target_user_id
     db.add(rewind)
-    db.delete(swipe)
-    db.commit()
+    await db.delete(swipe)
+    await db.commit()
+    deck_cache.invalidate(current_user.id)
+    await run_in_threadpool(update_swipe_learning, retract_swipe_signal, current_user.id)
     return {"success": True, "rewoundTargetUserId": str(target_user_id)}
 
 
 @router.get("/matches")
-def matches(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def matches(current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     rows = db.scalars(
         select(Match).where(
             or_(Match.user_id_1 == current_user.id, Match.user_id_2 == current_user.id),
@@ -165,7 +351,7 @@ def matches(current_user: User = Depends(get_current_user), db: Session = Depend
 
 
 @router.get("/likes")
-def likes(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def likes(current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     liked_by = select(Swipe.user_id).where(Swipe.target_user_id == current_user.id, Swipe.action == "like")
     blocked_users = select(UserBlock.blocked_id).where(UserBlock.blocker_id == current_user.id)
     blocked_by = select(UserBlock.blocker_id).where(UserBlock.blocked_id == current_user.id)
@@ -180,13 +366,17 @@ def likes(current_user: User = Depends(get_current_user), db: Session = Depends(
 
 
 @router.post("/likes/{like_id}/respond")
-def respond_to_like(like_id: str, payload: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def respond_to_like(like_id: str, payload: dict, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     if payload.get("isAccepted"):
         target_id = uuid.UUID(payload["userId"])
         db.add(Swipe(user_id=current_user.id, target_user_id=target_id, action="like"))
+        record_swipe_signal(db, current_user.id, target_id, "like")
+        deck_cache.discard_card(current_user.id, target_id)
     else:
         swipe = db.get(Swipe, like_id)
         if swipe and swipe.target_user_id == current_user.id:
             db.delete(swipe)
+            retract_swipe_signal(db, swipe.user_id)
+            deck_cache.invalidate(swipe.user_id)
     db.commit()
     return {"success": True}
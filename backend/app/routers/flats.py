@@ -4,11 +4,14 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
+from ..config import get_settings
 from ..database import get_db
-from ..deps import get_current_user
-from ..models import ChatMember, Flat, FlatApplication, User
+from ..deps import get_principal
+from ..models import ChatMember, Flat, FlatApplication
 from ..serializers import application_to_client, flat_to_client
+from ..services.geo import distance_km, haversine_km, within_radius
 from ..services.notifications import create_notification
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/flats", tags=["flats"])
 
@@ -19,10 +22,17 @@ def get_flats(
     minRent: int | None = None,
     maxRent: int | None = None,
     rooms: int | None = None,
+    latitude: float | None = Query(None, ge=-90, le=90),
+    longitude: float | None = Query(None, ge=-180, le=180),
+    radiusKm: float | None = Query(None, gt=0, le=500),
+    sort: str = Query("newest", pattern="^(newest|distance)$"),
     limit: int = Query(10, ge=1, le=50),
     offset: int = Query(0, ge=0),
     db: Session = Depends(get_db),
 ):
+    located = latitude is not None and longitude is not None
+    if (radiusKm is not None or sort == "distance") and not located:
+        raise HTTPException(status_code=400, detail="latitude and longitude are required for nearby search")
     query = select(Flat)
     count_query = select(func.count()).select_from(Flat)
     filters = [Flat.status == "active"]
@@ -34,18 +44,31 @@ def get_flats(
         filters.append(Flat.rent <= maxRent)
     if rooms is not None:
         filters.append(Flat.num_rooms == rooms)
+    radius_km = radiusKm or (get_settings().discovery_nearby_radius_km if sort == "distance" else None)
+    if radius_km is not None:
+        filters.extend(within_radius(Flat.latitude, Flat.longitude, latitude, longitude, radius_km))
 
     for condition in filters:
         query = query.where(condition)
         count_query = count_query.where(condition)
 
     total = db.scalar(count_query) or 0
-    flats = db.scalars(query.order_by(Flat.created_at.desc()).limit(limit).offset(offset)).all()
-    return {"status": "success", "flats": [flat_to_client(flat) for flat in flats], "pagination": {"limit": limit, "offset": offset, "total": total}}
+    if sort == "distance":
+        query = query.order_by(distance_km(Flat.latitude, Flat.longitude, latitude, longitude), Flat.created_at.desc())
+    else:
+        query = query.order_by(Flat.created_at.desc())
+    flats = db.scalars(query.limit(limit).offset(offset)).all()
+    results = []
+    for flat in flats:
+        data = flat_to_client(flat)
+        if located and flat.latitude is not None and flat.longitude is not None:
+            data["distanceKm"] = round(haversine_km(latitude, longitude, flat.latitude, flat.longitude), 2)
+        results.append(data)
+    return {"status": "success", "flats": results, "pagination": {"limit": limit, "offset": offset, "total": total}}
 
 
 @router.get("/applications/me")
-def get_my_applications(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_my_applications(current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     applications = db.scalars(select(FlatApplication).where(FlatApplication.user_id == current_user.id)).all()
     return {"applications": [application_to_client(application) for application in applications]}
 
@@ -59,7 +82,7 @@ def get_flat(flat_id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/{flat_id}/applications", status_code=201)
-def apply_for_flat(flat_id: str, payload: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def apply_for_flat(flat_id: str, payload: dict, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     flat_uuid = uuid.UUID(flat_id)
     flat = db.get(Flat, flat_uuid)
     if not flat or flat.status != "active":
@@ -97,13 +120,13 @@ def apply_for_flat(flat_id: str, payload: dict, current_user: User = Depends(get
 
 
 @router.get("/{flat_id}/applications")
-def get_flat_applications(flat_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_flat_applications(flat_id: str, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     applications = db.scalars(select(FlatApplication).where(FlatApplication.flat_id == uuid.UUID(flat_id))).all()
     return {"applications": [application_to_client(application) for application in applications]}
 
 
 @router.put("/applications/{application_id}")
-def update_application(application_id: str, payload: dict, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_application(application_id: str, payload: dict, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     application = db.get(FlatApplication, application_id)
     if not application:
         raise HTTPException(status_code=404, detail="Application not found")
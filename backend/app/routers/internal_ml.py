@@ -7,7 +7,9 @@ from sqlalchemy.orm import Session
 from ..config import get_settings
 from ..database import get_db
 from ..models import UserEmbedding
-from ..services.semantic_matching import rebuild_user_embedding
+from ..services.embedding_cache import embedding_cache
+from ..services.embedding_jobs import process_embedding_jobs
+from ..services.semantic_matching import quantization_report, rebuild_user_embedding, rebuild_user_embeddings
 
 router = APIRouter(prefix="/internal/ml", tags=["internal-ml"])
 
@@ -23,10 +25,28 @@ def health():
     return {"status": "ok", "service": "flinder-ml-worker"}
 
 
+@router.get("/embedding-cache/stats", dependencies=[Depends(require_worker_token)])
+def embedding_cache_stats():
+    return {"success": True, "cache": embedding_cache.stats()}
+
+
+@router.get("/embeddings/quantization-report", dependencies=[Depends(require_worker_token)])
+def embedding_quantization_report(dtype: str = "int8", sample: int = 200, topK: int = 10, db: Session = Depends(get_db)):
+    if dtype not in {"float16", "int8"}:
+        raise HTTPException(status_code=400, detail="dtype must be float16 or int8")
+    rows = db.scalars(
+        select(UserEmbedding)
+        .where(UserEmbedding.status == "ready")
+        .order_by(UserEmbedding.updated_at.desc())
+        .limit(max(2, min(sample, 1000)))
+    ).all()
+    return {"success": True, "report": quantization_report(list(rows), dtype, max(1, topK))}
+
+
 @router.post("/profiles/{user_id}/rebuild", dependencies=[Depends(require_worker_token)])
-def rebuild_profile(user_id: str, db: Session = Depends(get_db)):
+def rebuild_profile(user_id: str, forceLlm: bool = False, db: Session = Depends(get_db)):
     try:
-        row = rebuild_user_embedding(db, uuid.UUID(user_id))
+        row = rebuild_user_embedding(db, uuid.UUID(user_id), force_llm=forceLlm)
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
     return {
@@ -35,20 +55,27 @@ def rebuild_profile(user_id: str, db: Session = Depends(get_db)):
         "status": row.status,
         "model": row.model_name,
         "lastEmbeddedAt": row.last_embedded_at.isoformat() if row.last_embedded_at else None,
+        "rebuildReason": row.rebuild_reason,
         "error": row.error,
     }
 
 
 @router.post("/profiles/rebuild-missing", dependencies=[Depends(require_worker_token)])
-def rebuild_missing(limit: int = 25, db: Session = Depends(get_db)):
-    rows = db.scalars(
-        select(UserEmbedding)
+def rebuild_missing(limit: int = 25, forceLlm: bool = False, db: Session = Depends(get_db)):
+    user_ids = db.scalars(
+        select(UserEmbedding.user_id)
         .where(UserEmbedding.status.in_(["missing", "stale", "failed"]))
         .order_by(UserEmbedding.updated_at.asc())
-        .limit(max(1, min(limit, 100)))
+        .limit(max(1, min(limit, 500)))
     ).all()
-    results = []
-    for row in rows:
-        rebuilt = rebuild_user_embedding(db, row.user_id)
-        results.append({"userId": str(rebuilt.user_id), "status": rebuilt.status, "error": rebuilt.error})
+    rebuilt = rebuild_user_embeddings(db, list(user_ids), force_llm=forceLlm)
+    results = [
+        {"userId": str(row.user_id), "status": row.status, "rebuildReason": row.rebuild_reason, "error": row.error}
+        for row in rebuilt
+    ]
     return {"success": True, "processed": len(results), "results": results}
+
+
+@router.post("/jobs/process", dependencies=[Depends(require_worker_token)])
+def process_jobs(limit: int = 25, db: Session = Depends(get_db)):
+    return {"success": True, **process_embedding_jobs(db, max(1, min(limit, 500)))}
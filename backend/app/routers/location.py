@@ -7,15 +7,16 @@ from sqlalchemy.orm import Session
 
 from ..config import get_settings
 from ..database import get_db
-from ..deps import get_current_user
-from ..models import GeocodeCache, User
+from ..deps import get_principal
+from ..models import GeocodeCache
 from ..schemas import GeocodeRequest
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/location", tags=["location"])
 
 
 @router.post("/search")
-def geocode(payload: GeocodeRequest, _: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def geocode(payload: GeocodeRequest, _: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     query = " ".join(payload.query.strip().lower().split())
     cached = db.scalar(select(GeocodeCache).where(GeocodeCache.query == query))
     if cached:
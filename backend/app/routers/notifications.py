@@ -1,33 +1,49 @@
 import uuid
+from collections import Counter
+from datetime import datetime, timezone
 
 from fastapi import APIRouter, Depends
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..deps import get_current_user
-from ..models import Notification, User
+from ..database import get_async_db
+from ..deps import get_principal_async
+from ..models import Notification
 from ..serializers import notification_to_client
+from ..services.badges import release_unread_notifications_statement, unread_notifications_statement
+from ..services.notification_retention import notification_visible
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/api/notifications", tags=["notifications"])
 
 
 @router.get("")
-def list_notifications(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    rows = db.scalars(
-        select(Notification)
-        .where(Notification.user_id == current_user.id)
-        .order_by(Notification.created_at.desc())
-        .limit(50)
+async def list_notifications(current_user: Principal = Depends(get_principal_async), db: AsyncSession = Depends(get_async_db)):
+    rows = (
+        await db.scalars(
+            select(Notification)
+            .where(Notification.user_id == current_user.id, notification_visible(datetime.now(timezone.utc)))
+            .order_by(Notification.created_at.desc())
+            .limit(50)
+        )
     ).all()
-    unread = sum(1 for row in rows if not row.is_read)
+    unread = await db.scalar(unread_notifications_statement(current_user.id))
     return {"success": True, "unreadCount": unread, "notifications": [notification_to_client(row) for row in rows]}
 
 
 @router.post("/{notification_id}/read")
-def mark_notification_read(notification_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    notification = db.get(Notification, uuid.UUID(notification_id))
-    if notification and notification.user_id == current_user.id:
-        notification.is_read = True
-        db.commit()
+async def mark_notification_read(
+    notification_id: str,
+    current_user: Principal = Depends(get_principal_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    read = await db.scalar(
+        update(Notification)
+        .where(Notification.id == uuid.UUID(notification_id), Notification.user_id == current_user.id, Notification.is_read.is_(False))
+        .values(is_read=True)
+        .returning(Notification.id)
+    )
+    if read:
+        await db.execute(release_unread_notifications_statement(Counter([current_user.id])))
+    await db.commit()
     return {"success": True}
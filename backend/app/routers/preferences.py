@@ -3,17 +3,19 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..deps import get_current_user
-from ..models import Preference, User
+from ..deps import get_principal
+from ..models import Preference
 from ..schemas import PreferencesRequest
 from ..serializers import preference_to_client
-from ..services.semantic_matching import mark_embedding_stale, trigger_embedding_rebuild
+from ..services.embedding_jobs import enqueue_embedding_rebuild
+from ..services.principal_cache import Principal
+from ..services.semantic_matching import mark_embedding_stale
 
 router = APIRouter(prefix="/api/preferences", tags=["preferences"])
 
 
 @router.get("")
-def get_preferences(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_preferences(current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     preference = db.scalar(select(Preference).where(Preference.user_id == current_user.id))
     if not preference:
         raise HTTPException(status_code=404, detail="Preferences not found")
@@ -23,7 +25,7 @@ def get_preferences(current_user: User = Depends(get_current_user), db: Session
 @router.put("")
 def update_preferences(
     payload: PreferencesRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_principal),
     db: Session = Depends(get_db),
 ):
     preference = db.scalar(select(Preference).where(Preference.user_id == current_user.id))
@@ -34,8 +36,8 @@ def update_preferences(
     preference.discovery_settings = payload.discoverySettings
     preference.interests = payload.interests
     db.add(preference)
-    mark_embedding_stale(db, current_user.id)
+    if mark_embedding_stale(db, current_user.id):
+        enqueue_embedding_rebuild(db, current_user.id)
     db.commit()
     db.refresh(preference)
-    trigger_embedding_rebuild(current_user.id)
     return {"success": True, "message": "Preferences updated successfully", "preferences": preference_to_client(preference)}
@@ -9,7 +9,10 @@ from ..deps import get_current_user
 from ..models import Boost, Profile, ProfilePicture, User
 from ..schemas import PictureRequest, ProfileRequest
 from ..serializers import picture_to_client, profile_to_client
-from ..services.semantic_matching import mark_embedding_stale, trigger_embedding_rebuild
+from ..services.deck_cache import deck_cache
+from ..services.discovery import BOOST_POINTS
+from ..services.embedding_jobs import enqueue_embedding_rebuild
+from ..services.semantic_matching import mark_embedding_stale
 from ..services.storage import delete_object_by_url, upload_profile_image
 
 router = APIRouter(prefix="/api/profile", tags=["profile"])
@@ -83,10 +86,10 @@ def update_profile(
     profile.onboarding_step = step
     current_user.profile_completed = score >= 70
     db.add(profile)
-    mark_embedding_stale(db, current_user.id)
+    if mark_embedding_stale(db, current_user.id):
+        enqueue_embedding_rebuild(db, current_user.id)
     db.commit()
     db.refresh(profile)
-    trigger_embedding_rebuild(current_user.id)
     return {"success": True, "message": "Profile updated successfully", "profile": profile_to_client(profile, current_user)}
 
 
@@ -135,6 +138,7 @@ def boost_profile(current_user: User = Depends(get_current_user), db: Session =
     db.add(boost)
     db.commit()
     db.refresh(boost)
+    deck_cache.apply_boost(current_user.id, BOOST_POINTS)
     return {"success": True, "boost": {"id": str(boost.id), "expiresAt": boost.expires_at.isoformat()}}
 
 
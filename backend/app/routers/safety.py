@@ -5,16 +5,18 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from ..deps import get_current_user
+from ..deps import get_principal
 from ..models import Flat, FlatReport, User, UserBlock, UserReport
 from ..schemas import BlockUserRequest, ReportFlatRequest, ReportUserRequest
 from ..serializers import block_to_client, flat_report_to_client, user_report_to_client
+from ..services.deck_cache import deck_cache
+from ..services.principal_cache import Principal
 
 router = APIRouter(prefix="/api", tags=["safety"])
 
 
 @router.post("/reports")
-def report_user(payload: ReportUserRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def report_user(payload: ReportUserRequest, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     target_id = uuid.UUID(payload.userId)
     if target_id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot report yourself")
@@ -33,7 +35,7 @@ def report_user(payload: ReportUserRequest, current_user: User = Depends(get_cur
 
 
 @router.post("/flat-reports")
-def report_flat(payload: ReportFlatRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def report_flat(payload: ReportFlatRequest, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     flat_id = uuid.UUID(payload.flatId)
     if not db.get(Flat, flat_id):
         raise HTTPException(status_code=404, detail="Flat not found")
@@ -45,7 +47,7 @@ def report_flat(payload: ReportFlatRequest, current_user: User = Depends(get_cur
 
 
 @router.post("/blocks")
-def block_user(payload: BlockUserRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def block_user(payload: BlockUserRequest, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     blocked_id = uuid.UUID(payload.userId)
     if blocked_id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot block yourself")
@@ -58,15 +60,19 @@ def block_user(payload: BlockUserRequest, current_user: User = Depends(get_curre
     db.add(block)
     db.commit()
     db.refresh(block)
+    deck_cache.discard_card(current_user.id, blocked_id)
+    deck_cache.discard_card(blocked_id, current_user.id)
     return {"success": True, "block": block_to_client(block)}
 
 
 @router.delete("/blocks/{user_id}")
-def unblock_user(user_id: str, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def unblock_user(user_id: str, current_user: Principal = Depends(get_principal), db: Session = Depends(get_db)):
     block = db.scalar(
         select(UserBlock).where(UserBlock.blocker_id == current_user.id, UserBlock.blocked_id == uuid.UUID(user_id))
     )
     if block:
         db.delete(block)
         db.commit()
+        deck_cache.invalidate(current_user.id)
+        deck_cache.invalidate(block.blocked_id)
     return {"success": True}
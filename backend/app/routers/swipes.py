@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..deps import get_current_user
-from ..models import User
+from ..database import get_async_db
+from ..deps import get_principal_async
+from ..services.principal_cache import Principal
 from .discovery import rewind_swipe
 
 router = APIRouter(prefix="/api/swipes", tags=["swipes"])
 
 
 @router.post("/rewind")
-def rewind(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    return rewind_swipe(current_user=current_user, db=db)
+async def rewind(current_user: Principal = Depends(get_principal_async), db: AsyncSession = Depends(get_async_db)):
+    return await rewind_swipe(current_user=current_user, db=db)
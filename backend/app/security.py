@@ -21,8 +21,9 @@ def verify_password(password: str, hashed_password: str) -> bool:
 
 def create_access_token(subject: str, claims: dict[str, Any] | None = None) -> str:
     settings = get_settings()
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=settings.jwt_expires_minutes)
-    payload = {"sub": subject, "exp": expires_at}
+    issued_at = datetime.now(timezone.utc)
+    expires_at = issued_at + timedelta(minutes=settings.jwt_expires_minutes)
+    payload = {"sub": subject, "iat": issued_at.timestamp(), "exp": expires_at}
     if claims:
         payload.update(claims)
     return jwt.encode(payload, settings.jwt_secret, algorithm=ALGORITHM)
@@ -1,5 +1,6 @@
 from datetime import date, datetime
 from typing import Any
+import uuid
 
 from .models import (
     Chat,
@@ -153,7 +154,7 @@ def message_to_client(message: Message) -> dict[str, Any]:
     }
 
 
-def chat_to_client(chat: Chat, last_message: Message | None = None) -> dict[str, Any]:
+def chat_to_client(chat: Chat, last_message: Message | None = None, viewer_id: uuid.UUID | None = None) -> dict[str, Any]:
     return {
         "id": str(chat.id),
         "is_group": chat.is_group,
@@ -169,7 +170,7 @@ def chat_to_client(chat: Chat, last_message: Message | None = None) -> dict[str,
         "last_activity": iso(last_message.sent_at if last_message else chat.updated_at),
         "last_message": last_message.content if last_message else None,
         "last_message_time": iso(last_message.sent_at if last_message else None),
-        "unread_count": 0,
+        "unread_count": next((member.unread_count or 0 for member in chat.members if member.user_id == viewer_id), 0),
     }
 
 
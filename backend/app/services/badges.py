@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import uuid
+from collections import Counter
+
+from sqlalchemy import Integer, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import UUID, insert as pg_insert
+
+from ..models import ChatMember, UserBadge
+
+
+def add_unread_notifications_statement(counts: Counter[uuid.UUID]):
+    statement = pg_insert(UserBadge).values(
+        [{"user_id": user_id, "unread_notifications": counts[user_id]} for user_id in sorted(counts)]
+    )
+    return statement.on_conflict_do_update(
+        index_elements=[UserBadge.user_id],
+        set_={
+            "unread_notifications": UserBadge.unread_notifications + statement.excluded.unread_notifications,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def release_unread_notifications_statement(counts: Counter[uuid.UUID]):
+    released = values(column("user_id", UUID(as_uuid=True)), column("released", Integer), name="released").data(
+        [(user_id, counts[user_id]) for user_id in sorted(counts)]
+    )
+    return (
+        update(UserBadge)
+        .where(UserBadge.user_id == released.c.user_id)
+        .values(
+            unread_notifications=func.greatest(UserBadge.unread_notifications - released.c.released, 0),
+            updated_at=func.now(),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def chat_message_sent_statement(chat_id: uuid.UUID, sender_id: uuid.UUID):
+    return (
+        update(ChatMember)
+        .where(ChatMember.chat_id == chat_id, ChatMember.user_id != sender_id)
+        .values(unread_count=ChatMember.unread_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def chat_messages_read_statement(chat_id: uuid.UUID, user_id: uuid.UUID, count: int | None = None):
+    return (
+        update(ChatMember)
+        .where(ChatMember.chat_id == chat_id, ChatMember.user_id == user_id)
+        .values(unread_count=0 if count is None else func.greatest(ChatMember.unread_count - count, 0))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def unread_notifications_statement(user_id: uuid.UUID):
+    return select(func.coalesce(func.max(UserBadge.unread_notifications), 0)).where(UserBadge.user_id == user_id)
+
+
+def badges_statement(user_id: uuid.UUID):
+    return select(
+        unread_notifications_statement(user_id).scalar_subquery(),
+        func.coalesce(func.sum(ChatMember.unread_count), 0),
+        func.count().filter(ChatMember.unread_count > 0),
+    ).where(ChatMember.user_id == user_id)
@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import delete, select, text
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models import UserEmbedding, UserEmbeddingTombstone
+from .semantic_matching import combined_embedding, embedding_load_options, quantize
+
+IVF_MIN_TRAIN_SIZE = 2048
+KMEANS_ITERATIONS = 8
+SYNC_OVERLAP = timedelta(seconds=60)
+TOMBSTONE_RETENTION = timedelta(days=7)
+INDEXED_STATUSES = ("ready", "stale")
+STORAGE_DTYPES = {"float16": np.float16, "int8": np.int8}
+
+logger = logging.getLogger("flinder.candidate_index")
+
+
+class CandidateIndex:
+    def __init__(self, min_train_size: int = IVF_MIN_TRAIN_SIZE, dtype: str = "") -> None:
+        self.min_train_size = min_train_size
+        self.dtype = dtype
+        self.ids: list[uuid.UUID] = []
+        self.positions: dict[uuid.UUID, int] = {}
+        self.vectors = np.zeros((0, 0), dtype=STORAGE_DTYPES.get(dtype, np.float32))
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.centroids: np.ndarray | None = None
+        self.trained_size = 0
+        self.synced_at: datetime | None = None
+        self.last_sync = 0.0
+        self.last_snapshot = 0.0
+        self.dirty = False
+        self.version = 0
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _ensure_capacity(self, dim: int) -> None:
+        count = len(self.ids)
+        if count < self.vectors.shape[0]:
+            return
+        capacity = max(64, 2 * count)
+        vectors = np.zeros((capacity, dim), dtype=self.vectors.dtype)
+        scales = np.ones(capacity, dtype=np.float32)
+        assignments = np.zeros(capacity, dtype=np.int32)
+        if count:
+            vectors[:count] = self.vectors[:count]
+            scales[:count] = self.scales[:count]
+            assignments[:count] = self.assignments[:count]
+        self.vectors = vectors
+        self.scales = scales
+        self.assignments = assignments
+
+    def _dense(self, positions: np.ndarray | slice) -> np.ndarray:
+        block = self.vectors[positions].astype(np.float32)
+        if self.dtype == "int8":
+            block *= self.scales[positions][:, None]
+        return block
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    def upsert(self, user_id: uuid.UUID, vector: np.ndarray | None) -> None:
+        if vector is None:
+            self.remove(user_id)
+            return
+        with self.lock:
+            if self.vectors.shape[1] and vector.shape[0] != self.vectors.shape[1]:
+                return
+            position = self.positions.get(user_id)
+            if position is None:
+                self._ensure_capacity(vector.shape[0])
+                position = len(self.ids)
+                self.ids.append(user_id)
+                self.positions[user_id] = position
+            self.vectors[position], self.scales[position] = quantize(vector, self.dtype)
+            if self.centroids is not None:
+                self.assignments[position] = self._assign(vector[None, :])[0]
+            self.version += 1
+            self.dirty = True
+
+    def remove(self, user_id: uuid.UUID) -> None:
+        with self.lock:
+            position = self.positions.pop(user_id, None)
+            if position is None:
+                return
+            last = len(self.ids) - 1
+            if position != last:
+                moved = self.ids[last]
+                self.ids[position] = moved
+                self.positions[moved] = position
+                self.vectors[position] = self.vectors[last]
+                self.scales[position] = self.scales[last]
+                self.assignments[position] = self.assignments[last]
+            self.ids.pop()
+            self.version += 1
+            self.dirty = True
+
+    def train(self, seed: int = 0) -> None:
+        with self.lock:
+            count = len(self.ids)
+            if count < self.min_train_size:
+                self.centroids = None
+                self.trained_size = 0
+                return
+            vectors = self._dense(slice(0, count))
+            version = self.version
+        rng = np.random.default_rng(seed)
+        list_count = max(1, int(np.sqrt(count)))
+        centroids = vectors[rng.choice(count, size=list_count, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(list_count):
+                members = vectors[labels == cluster]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[cluster] = centroid / norm if norm else centroid
+        labels = np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+        with self.lock:
+            self.centroids = centroids
+            if self.version == version:
+                self.assignments[:count] = labels
+            else:
+                self.assignments[: len(self.ids)] = self._assign(self._dense(slice(0, len(self.ids))))
+            self.trained_size = len(self.ids)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        exclude: set[uuid.UUID] | None = None,
+        nprobe: int = 8,
+    ) -> list[uuid.UUID]:
+        exclude = exclude or set()
+        with self.lock:
+            count = len(self.ids)
+            if not count or query.shape[0] != self.vectors.shape[1]:
+                return []
+            if self.centroids is None:
+                candidates = np.arange(count)
+            else:
+                probes = np.argsort(-(self.centroids @ query))[:nprobe]
+                candidates = np.flatnonzero(np.isin(self.assignments[:count], probes))
+            if not len(candidates):
+                return []
+            scores = self._dense(candidates) @ query
+            wanted = min(len(candidates), k + len(exclude))
+            top = np.argpartition(-scores, wanted - 1)[:wanted]
+            ordered = candidates[top[np.argsort(-scores[top])]]
+            results = [self.ids[position] for position in ordered if self.ids[position] not in exclude]
+        return results[:k]
+
+    def reset(self) -> None:
+        with self.lock:
+            self.ids = []
+            self.positions = {}
+            self.centroids = None
+            self.trained_size = 0
+            self.synced_at = None
+            self.version += 1
+            self.dirty = True
+
+    def sync(self, db: Session) -> int:
+        if self.synced_at and self.synced_at < datetime.now(timezone.utc) - TOMBSTONE_RETENTION:
+            self.reset()
+        query = select(UserEmbedding).options(*embedding_load_options())
+        if self.synced_at:
+            query = query.where(UserEmbedding.updated_at > self.synced_at - SYNC_OVERLAP)
+        changed = 0
+        latest = self.synced_at
+        for row in db.scalars(query.execution_options(yield_per=500)):
+            if row.status in INDEXED_STATUSES:
+                self.upsert(row.user_id, combined_embedding(row))
+            else:
+                self.remove(row.user_id)
+            if row.updated_at and (latest is None or row.updated_at > latest):
+                latest = row.updated_at
+            changed += 1
+        if self.synced_at:
+            deleted = select(UserEmbeddingTombstone.user_id, UserEmbeddingTombstone.deleted_at).where(
+                UserEmbeddingTombstone.deleted_at > self.synced_at - SYNC_OVERLAP
+            )
+            for user_id, deleted_at in db.execute(deleted):
+                self.remove(user_id)
+                latest = max(latest, deleted_at)
+                changed += 1
+        self.synced_at = latest
+        self.last_sync = time.monotonic()
+        if (self.centroids is None and len(self) >= self.min_train_size) or (self.trained_size and len(self) > 2 * self.trained_size):
+            self.train()
+        return changed
+
+    def save(self, path: str | Path) -> None:
+        with self.lock:
+            count = len(self.ids)
+            target = Path(path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temporary = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+            with temporary.open("wb") as handle:
+                np.savez(
+                    handle,
+                    ids=np.array([str(user_id) for user_id in self.ids], dtype=str),
+                    vectors=self.vectors[:count],
+                    scales=self.scales[:count],
+                    dtype=np.array(self.dtype),
+                    assignments=self.assignments[:count],
+                    centroids=self.centroids if self.centroids is not None else np.zeros((0, 0), dtype=np.float32),
+                    synced_at=np.array(self.synced_at.isoformat() if self.synced_at else ""),
+                )
+            os.replace(temporary, target)
+            self.dirty = False
+            self.last_snapshot = time.monotonic()
+
+    @classmethod
+    def load(cls, path: str | Path, min_train_size: int = IVF_MIN_TRAIN_SIZE) -> "CandidateIndex":
+        with np.load(path) as snapshot:
+            index = cls(min_train_size=min_train_size, dtype=str(snapshot["dtype"]) if "dtype" in snapshot else "")
+            index.ids = [uuid.UUID(value) for value in snapshot["ids"].tolist()]
+            index.positions = {user_id: position for position, user_id in enumerate(index.ids)}
+            index.vectors = snapshot["vectors"].astype(STORAGE_DTYPES.get(index.dtype, np.float32))
+            index.scales = snapshot["scales"].astype(np.float32) if "scales" in snapshot else np.ones(len(index.ids), dtype=np.float32)
+            index.assignments = snapshot["assignments"].astype(np.int32)
+            centroids = snapshot["centroids"]
+            index.centroids = centroids.astype(np.float32) if centroids.size else None
+            index.trained_size = len(index.ids) if index.centroids is not None else 0
+            synced_at = str(snapshot["synced_at"])
+            index.synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+        return index
+
+
+_index: CandidateIndex | None = None
+_pgvector_ready: bool | None = None
+
+
+def load_candidate_index() -> CandidateIndex:
+    settings = get_settings()
+    path = settings.candidate_index_path
+    if path and Path(path).exists():
+        return CandidateIndex.load(path)
+    return CandidateIndex(dtype=settings.embedding_compact_dtype)
+
+
+def get_candidate_index() -> CandidateIndex | None:
+    return _index
+
+
+def pgvector_available(db: Session) -> bool:
+    global _pgvector_ready
+    if _pgvector_ready is None:
+        _pgvector_ready = bool(db.scalar(text("select exists (select 1 from pg_extension where extname = 'vector')")))
+        if not _pgvector_ready:
+            logger.warning("pgvector extension is not installed, using the in-process candidate index")
+    return _pgvector_ready
+
+
+def retrieval_mode(db: Session) -> str:
+    mode = get_settings().discovery_retrieval_mode
+    return "ann" if mode == "pgvector" and not pgvector_available(db) else mode
+
+
+def refresh_candidate_index(db: Session) -> CandidateIndex:
+    global _index
+    settings = get_settings()
+    if _index is None:
+        _index = load_candidate_index()
+    index = _index
+    index.sync(db)
+    db.execute(
+        delete(UserEmbeddingTombstone).where(
+            UserEmbeddingTombstone.deleted_at < datetime.now(timezone.utc) - TOMBSTONE_RETENTION
+        )
+    )
+    db.commit()
+    if (
+        settings.candidate_index_path
+        and index.dirty
+        and time.monotonic() - index.last_snapshot >= settings.candidate_index_snapshot_seconds
+    ):
+        index.save(settings.candidate_index_path)
+    return index
+
+
+def run_candidate_index_worker(stop: threading.Event) -> None:
+    settings = get_settings()
+    while True:
+        try:
+            with SessionLocal() as db:
+                refresh_candidate_index(db)
+        except Exception:
+            logger.exception("Candidate index sync failed")
+        if stop.wait(settings.candidate_index_sync_seconds):
+            return
+
+
+def start_candidate_index_worker() -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=run_candidate_index_worker, args=(stop,), name="candidate-index", daemon=True).start()
+    return stop
+
+
+def upsert_candidate_vector(row: UserEmbedding) -> None:
+    if _index is not None:
+        _index.upsert(row.user_id, combined_embedding(row) if row.status in INDEXED_STATUSES else None)
+
+
+def nearest_candidate_ids(current: UserEmbedding | None, exclude: set[uuid.UUID]) -> list[uuid.UUID]:
+    if not current or current.status != "ready":
+        return []
+    query = combined_embedding(current)
+    if query is None:
+        return []
+    index = get_candidate_index()
+    if index is None:
+        return []
+    settings = get_settings()
+    return index.search(query, settings.candidate_index_top_k, exclude=exclude, nprobe=settings.candidate_index_nprobe)
+
+
+def pgvector_candidate_ids(db: Session, current: UserEmbedding | None, exclude: set[uuid.UUID]) -> list[uuid.UUID]:
+    if not current or current.status != "ready":
+        return []
+    query = combined_embedding(current)
+    if query is None:
+        return []
+    return list(
+        db.scalars(
+            select(UserEmbedding.user_id)
+            .where(UserEmbedding.status == "ready", UserEmbedding.embedding_combined.is_not(None))
+            .where(UserEmbedding.user_id.not_in(exclude))
+            .order_by(UserEmbedding.embedding_combined.max_inner_product(query.tolist()))
+            .limit(get_settings().candidate_index_top_k)
+        ).all()
+    )
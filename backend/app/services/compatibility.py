@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import numpy as np
+from sqlalchemy import delete, distinct, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, selectinload
+
+from ..config import get_settings
+from ..models import CompatibilityCandidate, CompatibilityJobState, Profile, UserEmbedding
+from .discovery import score_profile
+from .semantic_matching import CATEGORIES, CONFLICT_WEIGHT, category_vector, combined_embedding, embedding_load_options
+
+PRACTICAL_RERANK_FACTOR = 3
+
+
+def city_shard(city: str, shards: int) -> int:
+    return zlib.crc32(city.encode("utf-8")) % max(1, shards)
+
+
+def _unit_rows(rows: list[UserEmbedding], category: str, dim: int) -> np.ndarray:
+    matrix = np.zeros((len(rows), dim), dtype=np.float32)
+    for index, row in enumerate(rows):
+        vector = category_vector(row, category)
+        if vector is not None and len(vector) == dim:
+            values = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(values))
+            if norm:
+                matrix[index] = values / norm
+    return matrix
+
+
+class CityMatrix:
+    def __init__(self, profiles: list[Profile], embeddings: dict[uuid.UUID, UserEmbedding]) -> None:
+        combined = {profile.user_id: combined_embedding(embeddings.get(profile.user_id)) for profile in profiles}
+        self.profiles = [profile for profile in profiles if combined[profile.user_id] is not None]
+        self.positions = {profile.user_id: index for index, profile in enumerate(self.profiles)}
+        rows = [embeddings[profile.user_id] for profile in self.profiles]
+        self.combined = np.stack([combined[profile.user_id] for profile in self.profiles]) if rows else np.zeros((0, 0), dtype=np.float32)
+        dim = self.combined.shape[1] // len(CATEGORIES) if rows else 0
+        self.likes = _unit_rows(rows, "likes", dim)
+        self.dislikes = _unit_rows(rows, "dislikes", dim)
+
+    def semantic_points(self, positions: list[int]) -> np.ndarray:
+        weighted = (self.combined[positions] @ self.combined.T + 1) / 2
+        conflict = np.maximum(0.0, self.likes[positions] @ self.dislikes.T)
+        conflict += np.maximum(0.0, self.dislikes[positions] @ self.likes.T)
+        conflict = np.minimum(1.0, conflict * CONFLICT_WEIGHT)
+        return np.rint(np.clip(weighted - conflict, 0.0, 1.0) * 60).astype(np.int32)
+
+    def top_candidates(self, position: int, points: np.ndarray, top_n: int) -> list[tuple[uuid.UUID, int, int]]:
+        points = points.copy()
+        points[position] = -1
+        shortlist = np.argsort(-points, kind="stable")[: top_n * PRACTICAL_RERANK_FACTOR]
+        current = self.profiles[position]
+        scored = []
+        for index in shortlist.tolist():
+            if index == position:
+                continue
+            candidate = self.profiles[index]
+            semantic = {"available": True, "score": int(points[index])}
+            scored.append((candidate.user_id, score_profile(current, candidate, candidate.user, semantic)["score"], int(points[index])))
+        scored.sort(key=lambda item: (-item[1], str(item[0])))
+        return scored[:top_n]
+
+
+def load_city_matrix(db: Session, city: str) -> CityMatrix:
+    profiles = db.scalars(
+        select(Profile)
+        .options(selectinload(Profile.user))
+        .where(func.lower(Profile.city) == city)
+        .order_by(Profile.user_id)
+    ).all()
+    embeddings = {
+        row.user_id: row
+        for row in db.scalars(
+            select(UserEmbedding)
+            .where(
+                UserEmbedding.user_id.in_([profile.user_id for profile in profiles]),
+                UserEmbedding.status == "ready",
+            )
+            .options(*embedding_load_options())
+        ).all()
+    }
+    return CityMatrix(list(profiles), embeddings)
+
+
+def stale_user_ids(
+    db: Session,
+    city: str,
+    matrix: CityMatrix,
+    embeddings_hash: dict[uuid.UUID, str | None],
+    top_n: int,
+    block_size: int = 256,
+) -> tuple[set[uuid.UUID], set[uuid.UUID]]:
+    stored: dict[uuid.UUID, str | None] = {}
+    lists: dict[uuid.UUID, set[uuid.UUID]] = {}
+    floors: dict[uuid.UUID, int] = {}
+    for user_id, candidate_id, semantic_score, source_hash in db.execute(
+        select(
+            CompatibilityCandidate.user_id,
+            CompatibilityCandidate.candidate_id,
+            CompatibilityCandidate.semantic_score,
+            CompatibilityCandidate.source_hash,
+        ).where(CompatibilityCandidate.city == city)
+    ).all():
+        stored[user_id] = source_hash
+        lists.setdefault(user_id, set()).add(candidate_id)
+        floors[user_id] = min(floors.get(user_id, semantic_score), semantic_score)
+    departed = set(stored) - set(matrix.positions)
+    changed = [user_id for user_id in matrix.positions if user_id not in stored or stored[user_id] != embeddings_hash.get(user_id)]
+    moved = set(changed) | departed
+    stale = set(changed) | {user_id for user_id, candidates in lists.items() if user_id in matrix.positions and candidates & moved}
+    for start in range(0, len(changed), block_size):
+        best = matrix.semantic_points([matrix.positions[user_id] for user_id in changed[start : start + block_size]]).max(axis=0)
+        stale.update(
+            user_id
+            for user_id, position in matrix.positions.items()
+            if len(lists.get(user_id, ())) < top_n or best[position] >= floors[user_id]
+        )
+    return stale, departed
+
+
+def compute_city(db: Session, city: str, full: bool = False, top_n: int | None = None, block_size: int | None = None) -> int:
+    settings = get_settings()
+    top_n = top_n or settings.compatibility_top_n
+    block_size = block_size or settings.compatibility_block_size
+    mode = "full" if full else "incremental"
+    state = db.get(CompatibilityJobState, city)
+    resume = bool(state and state.status == "running" and state.mode == mode and state.pending_user_ids is not None)
+    if not resume:
+        state = db.merge(
+            CompatibilityJobState(city=city, status="running", mode=mode, cursor_user_id=None, pending_user_ids=None, processed=0)
+        )
+        state.started_at = datetime.now(timezone.utc)
+        state.finished_at = None
+        db.commit()
+
+    matrix = load_city_matrix(db, city)
+    hashes = dict(
+        db.execute(
+            select(UserEmbedding.user_id, UserEmbedding.source_hash).where(
+                UserEmbedding.user_id.in_(list(matrix.positions))
+            )
+        ).all()
+    )
+    if resume:
+        targets = [user_id for user_id in state.pending_user_ids if user_id in matrix.positions]
+        if state.cursor_user_id:
+            targets = [user_id for user_id in targets if str(user_id) > str(state.cursor_user_id)]
+    else:
+        targets = [profile.user_id for profile in matrix.profiles]
+        if not full:
+            stale, departed = stale_user_ids(db, city, matrix, hashes, top_n, block_size)
+            targets = [user_id for user_id in targets if user_id in stale]
+            if departed:
+                db.execute(
+                    delete(CompatibilityCandidate).where(
+                        CompatibilityCandidate.city == city, CompatibilityCandidate.user_id.in_(list(departed))
+                    )
+                )
+        targets.sort(key=str)
+        state.pending_user_ids = targets
+        db.commit()
+
+    for start in range(0, len(targets), block_size):
+        block = targets[start : start + block_size]
+        positions = [matrix.positions[user_id] for user_id in block]
+        points = matrix.semantic_points(positions)
+        now = datetime.now(timezone.utc)
+        values: list[dict[str, Any]] = []
+        for offset, (user_id, position) in enumerate(zip(block, positions)):
+            for candidate_id, score, semantic_score in matrix.top_candidates(position, points[offset], top_n):
+                values.append(
+                    {
+                        "user_id": user_id,
+                        "candidate_id": candidate_id,
+                        "city": city,
+                        "score": score,
+                        "semantic_score": semantic_score,
+                        "source_hash": hashes.get(user_id),
+                        "computed_at": now,
+                    }
+                )
+        db.execute(delete(CompatibilityCandidate).where(CompatibilityCandidate.user_id.in_(block)))
+        if values:
+            db.execute(pg_insert(CompatibilityCandidate).values(values))
+        state.cursor_user_id = block[-1]
+        state.processed = (state.processed or 0) + len(block)
+        db.commit()
+
+    state.status = "done"
+    state.pending_user_ids = None
+    state.finished_at = datetime.now(timezone.utc)
+    db.commit()
+    return len(targets)
+
+
+def compatibility_cities(db: Session, shard: int = 0, shards: int = 1, min_users: int = 2) -> list[str]:
+    city = func.lower(Profile.city)
+    rows = db.execute(
+        select(city, func.count(distinct(Profile.user_id)))
+        .where(Profile.city.is_not(None))
+        .group_by(city)
+        .having(func.count(distinct(Profile.user_id)) >= min_users)
+        .order_by(func.count(distinct(Profile.user_id)).desc())
+    ).all()
+    return [name for name, _ in rows if name and city_shard(name, shards) == shard]
+
+
+def precomputed_candidate_ids(db: Session, user_id: uuid.UUID, limit: int) -> list[uuid.UUID]:
+    query = select(CompatibilityCandidate.candidate_id).where(CompatibilityCandidate.user_id == user_id)
+    max_age = get_settings().compatibility_max_age_hours
+    if max_age > 0:
+        query = query.where(CompatibilityCandidate.computed_at >= datetime.now(timezone.utc) - timedelta(hours=max_age))
+    return list(db.scalars(query.order_by(CompatibilityCandidate.score.desc()).limit(limit)).all())
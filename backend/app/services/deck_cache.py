@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import base64
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, NamedTuple
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import Swipe, UserBlock
+
+EXCLUSION_OVERLAP = timedelta(seconds=60)
+
+
+def card_score(card: dict[str, Any]) -> int:
+    return int(card["compatibility"]["score"])
+
+
+def card_key(card: dict[str, Any]) -> tuple[int, str]:
+    return -card_score(card), card["userId"]
+
+
+class Cursor(NamedTuple):
+    after: tuple[int, str]
+    built_at: str | None
+    served: int
+
+
+def encode_cursor(card: dict[str, Any], built_at: datetime | None = None, served: int = 0) -> str:
+    payload = {"s": card_score(card), "u": card["userId"], "n": served}
+    if built_at:
+        payload["b"] = built_at.isoformat()
+    encoded = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(encoded.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        built_at = payload.get("b")
+        return Cursor(
+            (-int(payload["s"]), str(uuid.UUID(payload["u"]))),
+            str(built_at) if built_at else None,
+            max(0, int(payload.get("n", 0))),
+        )
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+@dataclass
+class Deck:
+    cards: OrderedDict[uuid.UUID, dict[str, Any]]
+    built_at: datetime
+    expires_at: float
+    complete: bool = False
+    seen: set[uuid.UUID] = field(default_factory=set)
+    served: set[uuid.UUID] = field(default_factory=set)
+
+    def pinned(self, cursor: Cursor | None) -> bool:
+        return bool(cursor and cursor.built_at == self.built_at.isoformat())
+
+    def page(
+        self, size: int, after: tuple[int, str] | None = None, pinned: bool = False, restart: bool | None = None
+    ) -> list[dict[str, Any]]:
+        if restart or restart is None and not pinned:
+            self.served.clear()
+        cards = (
+            card
+            for user_id, card in list(self.cards.items())
+            if user_id not in self.served and (pinned or after is None or card_key(card) > after)
+        )
+        page = [card for _, card in zip(range(size), cards)]
+        self.served.update(uuid.UUID(card["userId"]) for card in page)
+        return page
+
+
+class DeckCache:
+    def __init__(self, ttl_seconds: int, max_cards: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_cards = max_cards
+        self.decks: OrderedDict[uuid.UUID, Deck] = OrderedDict()
+        self.card_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _drop(self, user_id: uuid.UUID) -> None:
+        deck = self.decks.pop(user_id, None)
+        if deck:
+            self.card_count -= len(deck.cards)
+
+    def get(self, user_id: uuid.UUID) -> Deck | None:
+        with self.lock:
+            deck = self.decks.get(user_id)
+            if deck and deck.expires_at <= time.monotonic():
+                self._drop(user_id)
+                deck = None
+            if not deck:
+                self.misses += 1
+                return None
+            self.decks.move_to_end(user_id)
+            self.hits += 1
+            return deck
+
+    def put(self, user_id: uuid.UUID, cards: list[dict[str, Any]], built_at: datetime, complete: bool = False) -> Deck:
+        deck = Deck(
+            cards=OrderedDict((uuid.UUID(card["userId"]), card) for card in cards),
+            built_at=built_at,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            complete=complete,
+        )
+        deck.seen.update(deck.cards)
+        with self.lock:
+            self._drop(user_id)
+            self.decks[user_id] = deck
+            self.card_count += len(deck.cards)
+            while self.card_count > self.max_cards and len(self.decks) > 1:
+                oldest = next(iter(self.decks))
+                self._drop(oldest)
+                self.evictions += 1
+        return deck
+
+    def page(
+        self, deck: Deck, size: int, after: tuple[int, str] | None = None, pinned: bool = False, restart: bool | None = None
+    ) -> list[dict[str, Any]]:
+        with self.lock:
+            return deck.page(size, after, pinned, restart)
+
+    def extend(self, user_id: uuid.UUID, deck: Deck, cards: list[dict[str, Any]], complete: bool) -> None:
+        with self.lock:
+            added = 0
+            for card in sorted(cards, key=card_key):
+                card_user_id = uuid.UUID(card["userId"])
+                if card_user_id not in deck.seen:
+                    deck.cards[card_user_id] = card
+                    deck.seen.add(card_user_id)
+                    added += 1
+            deck.complete = complete
+            if self.decks.get(user_id) is deck:
+                self.card_count += added
+
+    def discard_card(self, user_id: uuid.UUID, card_user_id: uuid.UUID) -> None:
+        with self.lock:
+            deck = self.decks.get(user_id)
+            if deck and deck.cards.pop(card_user_id, None) is not None:
+                self.card_count -= 1
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        with self.lock:
+            self._drop(user_id)
+
+    def remove_user_everywhere(self, card_user_id: uuid.UUID) -> None:
+        with self.lock:
+            for deck in self.decks.values():
+                if deck.cards.pop(card_user_id, None) is not None:
+                    self.card_count -= 1
+
+    def apply_boost(self, card_user_id: uuid.UUID, points: int) -> None:
+        with self.lock:
+            for deck in self.decks.values():
+                card = deck.cards.get(card_user_id)
+                if not card or card["compatibility"].get("boosted"):
+                    continue
+                card["compatibility"]["score"] += points
+                card["compatibility"]["boosted"] = True
+                ordered = sorted(deck.cards.items(), key=lambda item: card_key(item[1]))
+                deck.cards = OrderedDict(ordered)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.decks.clear()
+            self.card_count = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "decks": len(self.decks),
+                "cards": self.card_count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+deck_cache = DeckCache(
+    ttl_seconds=get_settings().deck_cache_ttl_seconds,
+    max_cards=get_settings().deck_cache_max_cards,
+)
+
+
+def recent_exclusions(db: Session, user_id: uuid.UUID, since: datetime) -> set[uuid.UUID]:
+    cutoff = since - EXCLUSION_OVERLAP
+    return set(
+        db.scalars(
+            union(
+                select(Swipe.target_user_id).where(Swipe.user_id == user_id, Swipe.created_at >= cutoff),
+                select(UserBlock.blocked_id).where(UserBlock.blocker_id == user_id, UserBlock.created_at >= cutoff),
+                select(UserBlock.blocker_id).where(UserBlock.blocked_id == user_id, UserBlock.created_at >= cutoff),
+            )
+        ).all()
+    )
+
+
+def cached_deck(db: Session, user_id: uuid.UUID) -> Deck | None:
+    if not get_settings().deck_cache_enabled:
+        return None
+    deck = deck_cache.get(user_id)
+    if not deck:
+        return None
+    for excluded_id in recent_exclusions(db, user_id, deck.built_at):
+        deck_cache.discard_card(user_id, excluded_id)
+    return deck
+
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import DeviceInfo
+
+
+class DeviceCache:
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries: OrderedDict[uuid.UUID, tuple[tuple[uuid.UUID, ...], float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def put(self, user_id: uuid.UUID, device_ids: Iterable[uuid.UUID]) -> None:
+        with self.lock:
+            self.entries[user_id] = (tuple(device_ids), time.monotonic() + self.ttl_seconds)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def devices(self, db: Session, user_ids: Iterable[uuid.UUID]) -> dict[uuid.UUID, tuple[uuid.UUID, ...]]:
+        found: dict[uuid.UUID, tuple[uuid.UUID, ...]] = {}
+        missing: list[uuid.UUID] = []
+        now = time.monotonic()
+        with self.lock:
+            for user_id in dict.fromkeys(user_ids):
+                entry = self.entries.get(user_id) if self.ttl_seconds > 0 else None
+                if entry and entry[1] > now:
+                    self.entries.move_to_end(user_id)
+                    found[user_id] = entry[0]
+                else:
+                    missing.append(user_id)
+        if missing:
+            loaded: dict[uuid.UUID, list[uuid.UUID]] = {user_id: [] for user_id in missing}
+            for user_id, device_id in db.execute(
+                select(DeviceInfo.user_id, DeviceInfo.id).where(
+                    DeviceInfo.user_id.in_(missing), DeviceInfo.push_token.is_not(None)
+                )
+            ).all():
+                loaded[user_id].append(device_id)
+            for user_id, device_ids in loaded.items():
+                self.put(user_id, device_ids)
+                found[user_id] = tuple(device_ids)
+        return found
+
+    def refresh(self, db: Session, user_id: uuid.UUID) -> tuple[uuid.UUID, ...]:
+        self.invalidate(user_id)
+        return self.devices(db, [user_id])[user_id]
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+device_cache = DeviceCache(
+    ttl_seconds=get_settings().device_cache_ttl_seconds,
+    max_entries=get_settings().device_cache_max_entries,
+)
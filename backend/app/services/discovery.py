@@ -1,7 +1,12 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import Any
 
-from ..models import Profile, User
+from sqlalchemy import Numeric, and_, case, func, literal_column, or_, select
+
+from ..models import Preference, Profile, User
+from .geo import within_radius
+
+BOOST_POINTS = 30
 
 
 def _budget_overlap(a: dict[str, Any], b: dict[str, Any]) -> bool:
@@ -67,3 +72,92 @@ def score_profile(
             score += 5
 
     return {"score": score, "reasons": reasons}
+
+
+def _number(value: Any) -> float | None:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _budget_bound(key: str):
+    field = literal_column(f"'{key}'")
+    is_number = func.jsonb_typeof(Profile.budget.op("->")(field)) == literal_column("'number'")
+    return case((is_number, Profile.budget.op("->>")(field).cast(Numeric)), else_=None)
+
+
+def _years_ago(today: date, years: int) -> date:
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
+
+def hard_filter_predicates(
+    current_user: User,
+    current_profile: Profile,
+    preference: Preference | None,
+    radius_km: float | None = None,
+    default_radius_km: float | None = None,
+) -> list:
+    critical = (preference.critical if preference else None) or {}
+    settings = (preference.discovery_settings if preference else None) or {}
+    location = critical.get("location") or {}
+    predicates = [
+        Profile.user_id.not_in(
+            select(Preference.user_id).where(Preference.discovery_settings["showMeToOthers"].as_boolean().is_(False))
+        ),
+        or_(Profile.gender_preference != "same_gender", User.gender == current_user.gender),
+    ]
+
+    radius = radius_km or _number(location.get("maxDistance")) or _number(settings.get("distance")) or default_radius_km
+    city = (location.get("city") or "").strip().lower()
+    if radius and current_profile.latitude is not None and current_profile.longitude is not None:
+        predicates.extend(
+            within_radius(Profile.latitude, Profile.longitude, current_profile.latitude, current_profile.longitude, radius)
+        )
+    elif city:
+        predicates.append(func.lower(Profile.city) == city)
+
+    budget = critical.get("budget") or {}
+    budget_min, budget_max = _number(budget.get("min")), _number(budget.get("max"))
+    if budget_max:
+        predicates.append(or_(_budget_bound("min").is_(None), _budget_bound("min") <= budget_max))
+    if budget_min:
+        predicates.append(or_(_budget_bound("max").is_(None), _budget_bound("max") >= budget_min))
+
+    room_type = critical.get("roomType")
+    if room_type and room_type != "any":
+        predicates.append(Profile.room_preference.in_([room_type, "any"]))
+
+    if critical.get("genderPreference") == "same_gender" and current_user.gender:
+        predicates.append(User.gender == current_user.gender)
+
+    age_range = settings.get("ageRange") or {}
+    today = datetime.now(timezone.utc).date()
+    min_age, max_age = _number(age_range.get("min")), _number(age_range.get("max"))
+    if min_age:
+        predicates.append(or_(User.date_of_birth.is_(None), User.date_of_birth <= _years_ago(today, int(min_age))))
+    if max_age:
+        predicates.append(or_(User.date_of_birth.is_(None), User.date_of_birth > _years_ago(today, int(max_age) + 1)))
+    return predicates
+
+
+def prefilter_score(current_profile: Profile):
+    current_city = (current_profile.city or (current_profile.location or {}).get("city") or "").lower()
+    budget = current_profile.budget or {}
+    budget_min, budget_max = _number(budget.get("min")), _number(budget.get("max"))
+    terms = [
+        case((User.last_active >= datetime.now(timezone.utc) - timedelta(days=7), 5), else_=0),
+        case((Profile.room_preference == current_profile.room_preference, 6), else_=0),
+    ]
+    if current_city:
+        terms.append(case((func.lower(Profile.city) == current_city, 15), else_=0))
+    if budget_min is not None and budget_max:
+        terms.append(case((and_(_budget_bound("min") <= budget_max, _budget_bound("max") >= budget_min), 12), else_=0))
+    if current_profile.languages:
+        terms.append(case((Profile.languages.overlap(current_profile.languages), 5), else_=0))
+    if current_profile.move_in_date:
+        terms.append(case((Profile.move_in_date == current_profile.move_in_date, 4), else_=0))
+    return sum(terms[1:], terms[0])
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..models import EmbeddingCacheEntry
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _remember(self, model_name: str, digest: str, vector: np.ndarray) -> None:
+        key = (model_name, digest)
+        self.entries[key] = vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, db: Session, model_name: str, digests: list[str]) -> dict[str, np.ndarray]:
+        rows = db.execute(
+            select(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.embedding).where(
+                EmbeddingCacheEntry.model_name == model_name,
+                EmbeddingCacheEntry.text_hash.in_(digests),
+            )
+        ).all()
+        return {digest: np.frombuffer(embedding, dtype=np.float32) for digest, embedding in rows}
+
+    def _store(self, db: Session, model_name: str, vectors: dict[str, np.ndarray]) -> None:
+        with db.begin_nested():
+            db.execute(
+                pg_insert(EmbeddingCacheEntry)
+                .values(
+                    [
+                        {"model_name": model_name, "text_hash": digest, "embedding": vector.astype(np.float32).tobytes()}
+                        for digest, vector in vectors.items()
+                    ]
+                )
+                .on_conflict_do_nothing()
+            )
+
+    def encode(
+        self,
+        db: Session | None,
+        model_name: str,
+        texts: list[str],
+        encoder: Callable[[list[str]], Any],
+    ) -> np.ndarray:
+        digests = [text_hash(text) for text in texts]
+        unique = dict(zip(digests, texts))
+        found: dict[str, np.ndarray] = {}
+        with self.lock:
+            for digest in unique:
+                vector = self.entries.get((model_name, digest))
+                if vector is not None:
+                    self.entries.move_to_end((model_name, digest))
+                    found[digest] = vector
+            self.memory_hits += sum(1 for digest in digests if digest in found) + len(digests) - len(unique)
+
+        missing = [digest for digest in unique if digest not in found]
+        stored = self._load(db, model_name, missing) if db is not None and missing else {}
+        missing = [digest for digest in missing if digest not in stored]
+        encoded: dict[str, np.ndarray] = {}
+        if missing:
+            vectors = encoder([unique[digest] for digest in missing])
+            encoded = {digest: np.asarray(vector, dtype=np.float32) for digest, vector in zip(missing, vectors)}
+            if db is not None:
+                self._store(db, model_name, encoded)
+
+        with self.lock:
+            for digest, vector in {**stored, **encoded}.items():
+                self._remember(model_name, digest, vector)
+            self.store_hits += len(stored)
+            self.misses += len(encoded)
+        found.update(stored)
+        found.update(encoded)
+        return np.stack([found[digest] for digest in digests])
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "memoryHits": self.memory_hits,
+                "storeHits": self.store_hits,
+                "misses": self.misses,
+                "hitRate": round((self.memory_hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+
+embedding_cache = EmbeddingCache(max_entries=get_settings().embedding_cache_max_entries)
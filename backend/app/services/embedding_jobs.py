@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models import EmbeddingJob
+from .semantic_matching import rebuild_user_embeddings
+
+logger = logging.getLogger("flinder.embedding_jobs")
+
+QUEUED_STATUSES = ("pending", "retry")
+
+
+def enqueue_embedding_rebuild(db: Session, user_id: uuid.UUID) -> None:
+    db.execute(
+        pg_insert(EmbeddingJob)
+        .values(id=uuid.uuid4(), user_id=user_id, status="pending")
+        .on_conflict_do_nothing(
+            index_elements=[EmbeddingJob.user_id], index_where=text("status in ('pending', 'retry')")
+        )
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    settings = get_settings()
+    seconds = settings.embedding_job_backoff_seconds * 2 ** max(0, attempts - 1)
+    return timedelta(seconds=min(seconds, settings.embedding_job_max_backoff_seconds))
+
+
+def claim_statement(limit: int, now: datetime):
+    stuck_before = now - timedelta(seconds=get_settings().embedding_job_stuck_seconds)
+    claimable = (
+        select(EmbeddingJob.id)
+        .where(
+            or_(
+                EmbeddingJob.status.in_(QUEUED_STATUSES) & (EmbeddingJob.run_after <= now),
+                (EmbeddingJob.status == "running") & (EmbeddingJob.locked_at < stuck_before),
+            )
+        )
+        .order_by(EmbeddingJob.run_after.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(EmbeddingJob)
+        .where(EmbeddingJob.id.in_(claimable))
+        .values(status="running", locked_at=now, attempts=EmbeddingJob.attempts + 1)
+        .returning(EmbeddingJob.id, EmbeddingJob.user_id, EmbeddingJob.attempts)
+    )
+
+
+def claim_embedding_jobs(db: Session, limit: int) -> list[tuple[uuid.UUID, uuid.UUID, int]]:
+    jobs = [tuple(row) for row in db.execute(claim_statement(limit, datetime.now(timezone.utc))).all()]
+    db.commit()
+    return jobs
+
+
+def _job_error(row: Any) -> str | None:
+    if row is None:
+        return "Profile not found"
+    if row.status != "ready":
+        return row.error or "Embedding rebuild failed"
+    return None
+
+
+def job_outcome(attempts: int, error: str | None, now: datetime) -> dict[str, Any]:
+    if error is None:
+        return {"status": "done", "locked_at": None, "last_error": None}
+    if attempts >= get_settings().embedding_job_max_attempts:
+        return {"status": "dead", "locked_at": None, "last_error": error}
+    return {"status": "retry", "locked_at": None, "last_error": error, "run_after": now + retry_delay(attempts)}
+
+
+def record_job_outcome(db: Session, job_id: uuid.UUID, outcome: dict[str, Any]) -> None:
+    statement = update(EmbeddingJob).where(EmbeddingJob.id == job_id)
+    if outcome["status"] != "retry":
+        db.execute(statement.values(**outcome))
+        return
+    try:
+        with db.begin_nested():
+            db.execute(statement.values(**outcome))
+    except IntegrityError:
+        outcome["status"] = "done"
+        outcome.pop("run_after", None)
+        db.execute(statement.values(**outcome))
+
+
+def finished_jobs_statement(now: datetime, limit: int):
+    doomed = (
+        select(EmbeddingJob.id)
+        .where(
+            EmbeddingJob.status == "done",
+            EmbeddingJob.updated_at < now - timedelta(days=get_settings().embedding_job_retention_days),
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(EmbeddingJob).where(EmbeddingJob.id.in_(doomed)).execution_options(synchronize_session=False)
+
+
+def purge_finished_embedding_jobs(db: Session, limit: int = 1000) -> int:
+    if get_settings().embedding_job_retention_days <= 0:
+        return 0
+    deleted = db.execute(finished_jobs_statement(datetime.now(timezone.utc), limit)).rowcount or 0
+    db.commit()
+    return deleted
+
+
+def process_embedding_jobs(db: Session, limit: int | None = None) -> dict[str, Any]:
+    jobs = claim_embedding_jobs(db, limit or get_settings().embedding_job_batch_size)
+    if not jobs:
+        return {"processed": 0, "done": 0, "retry": 0, "dead": 0}
+    try:
+        rows = {row.user_id: row for row in rebuild_user_embeddings(db, [user_id for _, user_id, _ in jobs])}
+        errors = {job_id: _job_error(rows.get(user_id)) for job_id, user_id, _ in jobs}
+    except Exception as exc:
+        db.rollback()
+        errors = {job_id: str(exc) for job_id, _, _ in jobs}
+    now = datetime.now(timezone.utc)
+    outcomes = [{"id": job_id, **job_outcome(attempts, errors[job_id], now)} for job_id, _, attempts in jobs]
+    for outcome in outcomes:
+        record_job_outcome(db, outcome.pop("id"), outcome)
+    db.commit()
+    statuses = [outcome["status"] for outcome in outcomes]
+    return {
+        "processed": len(jobs),
+        "done": statuses.count("done"),
+        "retry": statuses.count("retry"),
+        "dead": statuses.count("dead"),
+    }
+
+
+def run_embedding_job_worker(stop: threading.Event) -> None:
+    settings = get_settings()
+    while not stop.is_set():
+        try:
+            with SessionLocal() as db:
+                processed = process_embedding_jobs(db)["processed"]
+                if not processed:
+                    purge_finished_embedding_jobs(db)
+        except Exception:
+            logger.exception("Embedding job batch failed")
+            processed = 0
+        if not processed:
+            stop.wait(settings.embedding_job_poll_seconds)
+
+
+def start_embedding_job_worker() -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=run_embedding_job_worker, args=(stop,), name="embedding-jobs", daemon=True).start()
+    return stop
@@ -0,0 +1,69 @@
+import math
+from typing import Any
+
+from sqlalchemy import func, or_
+
+from ..config import get_settings
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float]:
+    delta_latitude = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_latitude = math.cos(math.radians(latitude))
+    delta_longitude = 180.0 if cos_latitude < 1e-6 else min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_latitude)))
+    return (
+        max(-90.0, latitude - delta_latitude),
+        min(90.0, latitude + delta_latitude),
+        longitude - delta_longitude,
+        longitude + delta_longitude,
+    )
+
+
+def longitude_ranges(min_longitude: float, max_longitude: float) -> list[tuple[float, float]]:
+    if max_longitude - min_longitude >= 360.0:
+        return [(-180.0, 180.0)]
+    if min_longitude < -180.0:
+        return [(min_longitude + 360.0, 180.0), (-180.0, max_longitude)]
+    if max_longitude > 180.0:
+        return [(min_longitude, 180.0), (-180.0, max_longitude - 360.0)]
+    return [(min_longitude, max_longitude)]
+
+
+def haversine_km(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    phi, other_phi = math.radians(latitude), math.radians(other_latitude)
+    half_chord = (
+        math.sin((other_phi - phi) / 2) ** 2
+        + math.cos(phi) * math.cos(other_phi) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(half_chord)))
+
+
+def distance_km(latitude_column: Any, longitude_column: Any, latitude: float, longitude: float):
+    if get_settings().geo_backend == "earthdistance":
+        return func.earth_distance(
+            func.ll_to_earth(latitude_column, longitude_column),
+            func.ll_to_earth(latitude, longitude),
+        ) / 1000.0
+    half_chord = func.power(func.sin(func.radians(latitude_column - latitude) / 2), 2) + func.cos(
+        func.radians(latitude)
+    ) * func.cos(func.radians(latitude_column)) * func.power(func.sin(func.radians(longitude_column - longitude) / 2), 2)
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(half_chord)))
+
+
+def within_radius(latitude_column: Any, longitude_column: Any, latitude: float, longitude: float, radius_km: float) -> list:
+    if get_settings().geo_backend == "earthdistance":
+        return [
+            func.earth_box(func.ll_to_earth(latitude, longitude), radius_km * 1000.0).op("@>")(
+                func.ll_to_earth(latitude_column, longitude_column)
+            ),
+            distance_km(latitude_column, longitude_column, latitude, longitude) <= radius_km,
+        ]
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+    ranges = longitude_ranges(min_longitude, max_longitude)
+    return [
+        latitude_column.between(min_latitude, max_latitude),
+        or_(*(longitude_column.between(low, high) for low, high in ranges)),
+        distance_km(latitude_column, longitude_column, latitude, longitude) <= radius_km,
+    ]
+
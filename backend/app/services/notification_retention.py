@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import and_, delete, or_, select, text
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models import Notification, NotificationDelivery
+from .badges import release_unread_notifications_statement
+
+logger = logging.getLogger("flinder.retention")
+
+FINISHED_DELIVERY_STATUSES = ("sent", "failed", "skipped")
+
+
+def notification_expiry(now: datetime) -> datetime | None:
+    days = get_settings().notification_retention_days
+    return now + timedelta(days=days) if days > 0 else None
+
+
+def notification_visible(now: datetime):
+    return or_(Notification.expire_at.is_(None), Notification.expire_at > now)
+
+
+def expired_notifications_statement(now: datetime, limit: int):
+    conditions = [Notification.expire_at <= now]
+    days = get_settings().notification_retention_days
+    if days > 0:
+        conditions.append(and_(Notification.expire_at.is_(None), Notification.created_at < now - timedelta(days=days)))
+    doomed = select(Notification.id).where(or_(*conditions)).limit(limit).with_for_update(skip_locked=True)
+    return (
+        delete(Notification)
+        .where(Notification.id.in_(doomed))
+        .returning(Notification.user_id, Notification.is_read)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def finished_deliveries_statement(now: datetime, limit: int):
+    doomed = (
+        select(NotificationDelivery.id)
+        .where(
+            NotificationDelivery.status.in_(FINISHED_DELIVERY_STATUSES),
+            NotificationDelivery.created_at < now - timedelta(days=get_settings().notification_delivery_retention_days),
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        delete(NotificationDelivery)
+        .where(NotificationDelivery.id.in_(doomed))
+        .returning(NotificationDelivery.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@dataclass
+class PurgeResult:
+    notifications: int = 0
+    deliveries: int = 0
+    batches: int = 0
+    complete: bool = True
+
+
+class RetentionMetrics:
+    def __init__(self) -> None:
+        self.runs = 0
+        self.failures = 0
+        self.notifications_deleted = 0
+        self.deliveries_deleted = 0
+        self.last_run_at: datetime | None = None
+        self.last_duration_ms = 0.0
+        self.last_result: PurgeResult | None = None
+        self.lock = threading.Lock()
+
+    def record(self, result: PurgeResult, duration: float) -> None:
+        with self.lock:
+            self.runs += 1
+            self.notifications_deleted += result.notifications
+            self.deliveries_deleted += result.deliveries
+            self.last_run_at = datetime.now(timezone.utc)
+            self.last_duration_ms = round(duration * 1000, 3)
+            self.last_result = result
+
+    def failed(self) -> None:
+        with self.lock:
+            self.failures += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            last = self.last_result
+            return {
+                "runs": self.runs,
+                "failures": self.failures,
+                "notificationsDeleted": self.notifications_deleted,
+                "deliveriesDeleted": self.deliveries_deleted,
+                "lastRunAt": self.last_run_at.isoformat() if self.last_run_at else None,
+                "lastDurationMs": self.last_duration_ms,
+                "lastBatches": last.batches if last else 0,
+                "lastComplete": last.complete if last else True,
+            }
+
+
+retention_metrics = RetentionMetrics()
+
+
+def release_purged_unread(db: Session, rows: list) -> None:
+    unread = Counter(user_id for user_id, is_read in rows if not is_read)
+    if unread:
+        db.execute(release_unread_notifications_statement(unread))
+
+
+def purge_batches(db: Session, statement_for, limit: int, max_batches: int, on_deleted=None) -> tuple[int, int, bool]:
+    deleted = batches = 0
+    while batches < max_batches:
+        rows = db.execute(statement_for(datetime.now(timezone.utc), limit)).all()
+        if on_deleted and rows:
+            on_deleted(db, rows)
+        db.commit()
+        batches += 1
+        deleted += len(rows)
+        if len(rows) < limit:
+            return deleted, batches, True
+    return deleted, batches, False
+
+
+def purge_notifications(db: Session, batch_size: int | None = None, max_batches: int | None = None) -> PurgeResult:
+    settings = get_settings()
+    limit = batch_size or settings.notification_purge_batch_size
+    budget = max_batches or settings.notification_purge_max_batches
+    started = time.perf_counter()
+    notifications, notification_batches, notifications_done = purge_batches(
+        db, expired_notifications_statement, limit, budget, release_purged_unread
+    )
+    deliveries, delivery_batches, deliveries_done = purge_batches(db, finished_deliveries_statement, limit, budget)
+    result = PurgeResult(notifications, deliveries, notification_batches + delivery_batches, notifications_done and deliveries_done)
+    retention_metrics.record(result, time.perf_counter() - started)
+    return result
+
+
+def table_estimates(db: Session) -> dict[str, int]:
+    rows = db.execute(
+        text("select relname, reltuples::bigint from pg_class where relname in ('notifications', 'notification_deliveries')")
+    ).all()
+    return {name: max(0, int(count)) for name, count in rows}
+
+
+def run_notification_purger(stop: threading.Event) -> None:
+    settings = get_settings()
+    while not stop.wait(settings.notification_purge_interval_seconds):
+        try:
+            with SessionLocal() as db:
+                result = purge_notifications(db)
+            if result.notifications or result.deliveries:
+                logger.info("Purged %s notifications and %s deliveries", result.notifications, result.deliveries)
+        except Exception:
+            retention_metrics.failed()
+            logger.exception("Notification purge failed")
+
+
+def start_notification_purger() -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=run_notification_purger, args=(stop,), name="notification-purger", daemon=True).start()
+    return stop
@@ -1,12 +1,32 @@
-from datetime import datetime, timezone
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from typing import Any
 import uuid
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, tuple_
 from sqlalchemy.orm import Session
 
 from ..config import get_settings
-from ..models import DeviceInfo, Notification, NotificationDelivery
+from ..models import Notification, NotificationDelivery
+from .badges import add_unread_notifications_statement
+from .device_cache import device_cache
+from .notification_retention import notification_expiry
+from .push_dispatch import push_provider_configured
+
+CoalesceKey = tuple[uuid.UUID, str, str]
+
+
+@dataclass
+class NotificationSpec:
+    user_id: uuid.UUID
+    type: str
+    title: str
+    body: str
+    data: dict[str, Any] | None = None
+    send_push: bool = True
+    coalesce_key: str | None = None
+    digest_title: str | None = None
 
 
 def create_notification(
@@ -17,67 +37,148 @@ def create_notification(
     body: str,
     data: dict[str, Any] | None = None,
     send_push: bool = True,
+    coalesce_key: str | None = None,
+    digest_title: str | None = None,
 ) -> Notification:
-    notification = Notification(user_id=user_id, type=type_, title=title, body=body, data=data or {})
-    db.add(notification)
-    db.flush()
-    if send_push:
-        queue_push_deliveries(db, notification)
-    return notification
-
-
-def queue_push_deliveries(db: Session, notification: Notification) -> None:
-    devices = db.scalars(
-        select(DeviceInfo).where(DeviceInfo.user_id == notification.user_id, DeviceInfo.push_token.is_not(None))
-    ).all()
-    if not devices:
-        db.add(NotificationDelivery(notification_id=notification.id, status="skipped", error="No registered push devices"))
-        return
-
-    settings = get_settings()
-    if not settings.firebase_credentials_path:
-        for device in devices:
-            db.add(
-                NotificationDelivery(
-                    notification_id=notification.id,
-                    device_info_id=device.id,
-                    status="skipped",
-                    error="Firebase credentials are not configured",
-                )
+    return create_notifications(
+        db, [NotificationSpec(user_id, type_, title, body, data, send_push, coalesce_key, digest_title)]
+    )[0]
+
+
+def create_notifications(db: Session, specs: list[NotificationSpec]) -> list[Notification]:
+    if not specs:
+        return []
+    existing = coalescible_notifications(db, specs)
+    coalescing = get_settings().notification_coalesce_seconds > 0
+    expire_at = notification_expiry(datetime.now(timezone.utc))
+    results: list[Notification | uuid.UUID] = []
+    rows: list[dict[str, Any]] = []
+    batched: dict[CoalesceKey, dict[str, Any]] = {}
+    pushes: dict[uuid.UUID, uuid.UUID] = {}
+    merged: dict[uuid.UUID, uuid.UUID] = {}
+    for spec in specs:
+        key = (spec.user_id, spec.type, spec.coalesce_key) if spec.coalesce_key and coalescing else None
+        if key in existing:
+            merge_notification(existing[key], spec)
+            existing[key].expire_at = expire_at
+            if spec.send_push:
+                merged[existing[key].id] = spec.user_id
+            results.append(existing[key])
+            continue
+        if key in batched:
+            row = batched[key]
+            row.update(merged_values(row["coalesced_count"] + 1, spec))
+            if spec.send_push:
+                pushes[row["id"]] = spec.user_id
+            results.append(row["id"])
+            continue
+        notification_id = uuid.uuid4()
+        rows.append(
+            {
+                "id": notification_id,
+                "user_id": spec.user_id,
+                "type": spec.type,
+                "title": spec.title,
+                "body": spec.body,
+                "data": spec.data or {},
+                "coalesce_key": spec.coalesce_key,
+                "coalesced_count": 1,
+                "expire_at": expire_at,
+            }
+        )
+        if key:
+            batched[key] = rows[-1]
+        if spec.send_push:
+            pushes[notification_id] = spec.user_id
+        results.append(notification_id)
+    created: dict[uuid.UUID, Notification] = {}
+    if rows:
+        created = {notification.id: notification for notification in db.scalars(insert(Notification).returning(Notification), rows)}
+        db.execute(add_unread_notifications_statement(Counter(row["user_id"] for row in rows)))
+    rearm: dict[uuid.UUID, uuid.UUID] = {}
+    if merged:
+        pending = pending_deliveries(db, list(merged))
+        rearm = {notification_id: user_id for notification_id, user_id in merged.items() if notification_id not in pending}
+    recipients = set(pushes.values()) | set(rearm.values())
+    devices = device_cache.devices(db, recipients) if recipients else {}
+    deliveries = delivery_rows(pushes, devices) + delivery_rows(
+        {notification_id: user_id for notification_id, user_id in rearm.items() if devices.get(user_id)}, devices
+    )
+    if deliveries:
+        db.execute(insert(NotificationDelivery), deliveries)
+    return [created[item] if isinstance(item, uuid.UUID) else item for item in results]
+
+
+def merged_values(count: int, spec: NotificationSpec) -> dict[str, Any]:
+    return {
+        "coalesced_count": count,
+        "title": spec.digest_title.replace("{count}", str(count)) if spec.digest_title else spec.title,
+        "body": spec.body,
+        "data": {**(spec.data or {}), "count": count},
+    }
+
+
+def merge_notification(notification: Notification, spec: NotificationSpec) -> None:
+    for name, value in merged_values((notification.coalesced_count or 1) + 1, spec).items():
+        setattr(notification, name, value)
+
+
+def coalescible_notifications(db: Session, specs: list[NotificationSpec]) -> dict[CoalesceKey, Notification]:
+    window = get_settings().notification_coalesce_seconds
+    keys = {(spec.user_id, spec.type, spec.coalesce_key) for spec in specs if spec.coalesce_key}
+    if window <= 0 or not keys:
+        return {}
+    found: dict[CoalesceKey, Notification] = {}
+    for notification in db.scalars(
+        select(Notification)
+        .where(
+            tuple_(Notification.user_id, Notification.type, Notification.coalesce_key).in_(list(keys)),
+            Notification.is_read.is_(False),
+            Notification.created_at >= datetime.now(timezone.utc) - timedelta(seconds=window),
+        )
+        .order_by(Notification.created_at.desc())
+        .with_for_update(skip_locked=True)
+    ).all():
+        found.setdefault((notification.user_id, notification.type, notification.coalesce_key), notification)
+    return found
+
+
+def pending_deliveries(db: Session, notification_ids: list[uuid.UUID]) -> set[uuid.UUID]:
+    return set(
+        db.scalars(
+            select(NotificationDelivery.notification_id).where(
+                NotificationDelivery.notification_id.in_(notification_ids), NotificationDelivery.status == "pending"
+            )
+        ).all()
+    )
+
+
+def delivery_rows(
+    pushes: dict[uuid.UUID, uuid.UUID], devices: dict[uuid.UUID, tuple[uuid.UUID, ...]]
+) -> list[dict[str, Any]]:
+    configured = push_provider_configured()
+    provider = get_settings().push_provider
+    rows: list[dict[str, Any]] = []
+    for notification_id, user_id in pushes.items():
+        if not devices.get(user_id):
+            rows.append(
+                {
+                    "notification_id": notification_id,
+                    "device_info_id": None,
+                    "provider": provider,
+                    "status": "skipped",
+                    "error": "No registered push devices",
+                }
             )
-        return
-
-    try:
-        import firebase_admin
-        from firebase_admin import credentials, messaging
-
-        if not firebase_admin._apps:
-            firebase_admin.initialize_app(credentials.Certificate(settings.firebase_credentials_path))
-
-        for device in devices:
-            delivery = NotificationDelivery(notification_id=notification.id, device_info_id=device.id)
-            try:
-                message_id = messaging.send(
-                    messaging.Message(
-                        token=device.push_token,
-                        notification=messaging.Notification(title=notification.title, body=notification.body),
-                        data={key: str(value) for key, value in (notification.data or {}).items()},
-                    )
-                )
-                delivery.status = "sent"
-                delivery.provider_message_id = message_id
-                delivery.sent_at = datetime.now(timezone.utc)
-            except Exception as exc:
-                delivery.status = "failed"
-                delivery.error = str(exc)
-            db.add(delivery)
-    except Exception as exc:
-        for device in devices:
-            db.add(
-                NotificationDelivery(
-                    notification_id=notification.id,
-                    device_info_id=device.id,
-                    status="failed",
-                    error=str(exc),
-                )
+            continue
+        for device_id in devices[user_id]:
+            rows.append(
+                {
+                    "notification_id": notification_id,
+                    "device_info_id": device_id,
+                    "provider": provider,
+                    "status": "pending" if configured else "skipped",
+                    "error": None if configured else "Firebase credentials are not configured",
+                }
             )
+    return rows
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from ..config import get_settings
+from ..models import User
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: uuid.UUID
+    name: str
+    role: str
+    account_status: str
+    gender: str | None = None
+    sessions_valid_after: datetime | None = None
+
+    @classmethod
+    def from_user(cls, user: User) -> Principal:
+        return cls(
+            id=user.id,
+            name=user.name,
+            role=getattr(user, "role", None) or "user",
+            account_status=getattr(user, "account_status", None) or "active",
+            gender=user.gender,
+            sessions_valid_after=getattr(user, "sessions_valid_after", None),
+        )
+
+    def accepts(self, payload: dict[str, Any]) -> bool:
+        if self.sessions_valid_after is None:
+            return True
+        return float(payload.get("iat") or 0) > self.sessions_valid_after.timestamp()
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.tokens: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+        self.principals: OrderedDict[uuid.UUID, tuple[Principal, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _get(self, store: OrderedDict, key: Any) -> Any:
+        with self.lock:
+            entry = store.get(key)
+            if entry and entry[1] <= time.monotonic():
+                del store[key]
+                entry = None
+            if not entry:
+                self.misses += 1
+                return None
+            store.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, store: OrderedDict, key: Any, value: Any, expires_at: float) -> None:
+        with self.lock:
+            store[key] = (value, expires_at)
+            store.move_to_end(key)
+            while len(store) > self.max_entries:
+                store.popitem(last=False)
+
+    def token(self, token: str) -> dict[str, Any] | None:
+        return self._get(self.tokens, token)
+
+    def peek_token(self, token: str) -> dict[str, Any] | None:
+        with self.lock:
+            entry = self.tokens.get(token)
+            return entry[0] if entry and entry[1] > time.monotonic() else None
+
+    def put_token(self, token: str, payload: dict[str, Any]) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        if payload.get("exp"):
+            expires_at = min(expires_at, time.monotonic() + float(payload["exp"]) - time.time())
+        self._put(self.tokens, token, payload, expires_at)
+
+    def principal(self, user_id: uuid.UUID) -> Principal | None:
+        return self._get(self.principals, user_id)
+
+    def put_principal(self, principal: Principal) -> None:
+        self._put(self.principals, principal.id, principal, time.monotonic() + self.ttl_seconds)
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        with self.lock:
+            self.principals.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.tokens.clear()
+            self.principals.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "tokens": len(self.tokens),
+                "principals": len(self.principals),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=get_settings().auth_cache_ttl_seconds,
+    max_entries=get_settings().auth_cache_max_entries,
+)
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from ..config import get_settings
+from ..database import SessionLocal
+from ..models import DeviceInfo, Notification, NotificationDelivery
+from .device_cache import device_cache
+
+logger = logging.getLogger("flinder.push")
+
+FCM_MAX_BATCH = 500
+
+
+@dataclass(frozen=True)
+class PushMessage:
+    token: str
+    title: str
+    body: str
+    data: dict[str, str] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class PushResult:
+    success: bool
+    message_id: str | None = None
+    error: str | None = None
+    retryable: bool = False
+    invalid_token: bool = False
+
+
+class FirebasePushProvider:
+    def __init__(self, credentials_path: str) -> None:
+        import firebase_admin
+        from firebase_admin import credentials
+
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(credentials_path))
+
+    def send_each(self, messages: list[PushMessage]) -> list[PushResult]:
+        from firebase_admin import exceptions, messaging
+
+        batch = messaging.send_each(
+            [
+                messaging.Message(
+                    token=message.token,
+                    notification=messaging.Notification(title=message.title, body=message.body),
+                    data=message.data,
+                )
+                for message in messages
+            ]
+        )
+        results = []
+        for response in batch.responses:
+            if response.success:
+                results.append(PushResult(True, message_id=response.message_id))
+                continue
+            error = response.exception
+            results.append(
+                PushResult(
+                    False,
+                    error=str(error),
+                    retryable=isinstance(error, (exceptions.UnavailableError, exceptions.InternalError, messaging.QuotaExceededError)),
+                    invalid_token=isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError)),
+                )
+            )
+        return results
+
+
+class FakePushProvider:
+    def __init__(self, invalid_tokens: set[str] | None = None, unavailable_tokens: set[str] | None = None) -> None:
+        self.invalid_tokens = invalid_tokens or set()
+        self.unavailable_tokens = unavailable_tokens or set()
+        self.batches: list[list[PushMessage]] = []
+        self.lock = threading.Lock()
+
+    def send_each(self, messages: list[PushMessage]) -> list[PushResult]:
+        with self.lock:
+            self.batches.append(list(messages))
+        results = []
+        for message in messages:
+            if message.token in self.invalid_tokens:
+                results.append(PushResult(False, error="Requested entity was not found.", invalid_token=True))
+            elif message.token in self.unavailable_tokens:
+                results.append(PushResult(False, error="FCM service unavailable", retryable=True))
+            else:
+                results.append(PushResult(True, message_id=f"fake/{uuid.uuid4().hex}"))
+        return results
+
+
+def push_provider_configured() -> bool:
+    settings = get_settings()
+    return settings.push_provider == "fake" or bool(settings.firebase_credentials_path)
+
+
+_provider: Any = None
+_provider_lock = threading.Lock()
+
+
+def get_push_provider() -> Any:
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            settings = get_settings()
+            _provider = FakePushProvider() if settings.push_provider == "fake" else FirebasePushProvider(settings.firebase_credentials_path)
+        return _provider
+
+
+def send_batched(provider: Any, messages: list[PushMessage], batch_size: int, concurrency: int) -> list[PushResult]:
+    size = max(1, min(batch_size, FCM_MAX_BATCH))
+    chunks = [messages[start : start + size] for start in range(0, len(messages), size)]
+
+    def send(chunk: list[PushMessage]) -> list[PushResult]:
+        try:
+            return provider.send_each(chunk)
+        except Exception as exc:
+            return [PushResult(False, error=str(exc), retryable=True)] * len(chunk)
+
+    if len(chunks) <= 1 or concurrency <= 1:
+        return [result for chunk in chunks for result in send(chunk)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return [result for results in executor.map(send, chunks) for result in results]
+
+
+def claim_statement(limit: int, now: datetime):
+    stuck_before = now - timedelta(seconds=get_settings().push_stuck_seconds)
+    claimable = (
+        select(NotificationDelivery.id)
+        .where(
+            or_(
+                (NotificationDelivery.status == "pending") & (NotificationDelivery.run_after <= now),
+                (NotificationDelivery.status == "sending") & (NotificationDelivery.locked_at < stuck_before),
+            )
+        )
+        .order_by(NotificationDelivery.run_after.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(NotificationDelivery)
+        .where(NotificationDelivery.id.in_(claimable))
+        .values(status="sending", locked_at=now, attempts=NotificationDelivery.attempts + 1)
+        .returning(NotificationDelivery.id, NotificationDelivery.attempts)
+    )
+
+
+def delivery_outcome(result: PushResult, attempts: int, now: datetime) -> dict[str, Any]:
+    settings = get_settings()
+    if result.success:
+        return {"status": "sent", "provider_message_id": result.message_id, "sent_at": now, "error": None, "locked_at": None}
+    if result.retryable and attempts < settings.push_max_attempts:
+        delay = min(settings.push_backoff_seconds * 2 ** max(0, attempts - 1), settings.push_max_backoff_seconds)
+        return {"status": "pending", "error": result.error, "locked_at": None, "run_after": now + timedelta(seconds=delay)}
+    return {"status": "failed", "error": result.error, "locked_at": None}
+
+
+def dispatch_pending_pushes(db: Session, limit: int | None = None, provider: Any | None = None) -> dict[str, int]:
+    settings = get_settings()
+    claimed = dict(
+        tuple(row) for row in db.execute(claim_statement(limit or settings.push_claim_limit, datetime.now(timezone.utc))).all()
+    )
+    db.commit()
+    if not claimed:
+        return {"claimed": 0, "sent": 0, "retry": 0, "failed": 0, "tokensRemoved": 0}
+    rows = db.execute(
+        select(NotificationDelivery.id, DeviceInfo.id, DeviceInfo.push_token, Notification.title, Notification.body, Notification.data)
+        .join(Notification, Notification.id == NotificationDelivery.notification_id)
+        .outerjoin(DeviceInfo, DeviceInfo.id == NotificationDelivery.device_info_id)
+        .where(NotificationDelivery.id.in_(list(claimed)))
+    ).all()
+    sendable = [row for row in rows if row[2]]
+    messages = [
+        PushMessage(token, title, body, {key: str(value) for key, value in (data or {}).items()})
+        for _, _, token, title, body, data in sendable
+    ]
+    results = send_batched(provider or get_push_provider(), messages, settings.push_batch_size, settings.push_concurrency)
+    now = datetime.now(timezone.utc)
+    outcomes = {row[0]: delivery_outcome(PushResult(False, error="Device has no push token"), claimed[row[0]], now) for row in rows if not row[2]}
+    invalid_devices: set[uuid.UUID] = set()
+    for row, result in zip(sendable, results):
+        outcomes[row[0]] = delivery_outcome(result, claimed[row[0]], now)
+        if result.invalid_token:
+            invalid_devices.add(row[1])
+    for delivery_id, values in outcomes.items():
+        db.execute(update(NotificationDelivery).where(NotificationDelivery.id == delivery_id).values(**values))
+    stale_users: list[uuid.UUID] = []
+    if invalid_devices:
+        stale_users = db.scalars(
+            update(DeviceInfo).where(DeviceInfo.id.in_(invalid_devices)).values(push_token=None).returning(DeviceInfo.user_id)
+        ).all()
+    db.commit()
+    for user_id in set(stale_users):
+        device_cache.invalidate(user_id)
+    statuses = [values["status"] for values in outcomes.values()]
+    return {
+        "claimed": len(claimed),
+        "sent": statuses.count("sent"),
+        "retry": statuses.count("pending"),
+        "failed": statuses.count("failed"),
+        "tokensRemoved": len(invalid_devices),
+    }
+
+
+def run_push_dispatcher(stop: threading.Event) -> None:
+    settings = get_settings()
+    while not stop.is_set():
+        try:
+            with SessionLocal() as db:
+                claimed = dispatch_pending_pushes(db)["claimed"]
+        except Exception:
+            logger.exception("Push dispatch batch failed")
+            claimed = 0
+        if not claimed:
+            stop.wait(settings.push_poll_seconds)
+
+
+def start_push_dispatcher() -> threading.Event:
+    stop = threading.Event()
+    threading.Thread(target=run_push_dispatcher, args=(stop,), name="push-dispatcher", daemon=True).start()
+    return stop
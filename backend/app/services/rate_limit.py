@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..config import get_settings
+from ..models import RateLimitBucket
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    group: str
+    limit: int
+    period: float = 60
+    per_path: bool = False
+    message: str = "Too many requests"
+
+    @property
+    def interval(self) -> float:
+        return self.period / max(1, self.limit)
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    retry_after: float = 0.0
+
+
+def gcra(tat: float | None, now: float, rule: RateLimit) -> tuple[bool, float, float]:
+    new_tat = max(tat or now, now) + rule.interval
+    allow_at = new_tat - rule.period
+    if now < allow_at:
+        return False, tat or now, allow_at - now
+    return True, new_tat, 0.0
+
+
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, float] = OrderedDict()
+        self.lock = threading.Lock()
+
+    async def hit(self, key: str, rule: RateLimit, now: float | None = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        with self.lock:
+            allowed, tat, retry_after = gcra(self.buckets.get(key), now, rule)
+            self.buckets[key] = tat
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return RateLimitResult(allowed, retry_after)
+
+
+def gcra_statement(key: str, now: float, rule: RateLimit):
+    new_tat = func.greatest(RateLimitBucket.tat, now) + rule.interval
+    return (
+        pg_insert(RateLimitBucket)
+        .values(key=key, tat=now + rule.interval)
+        .on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tat": new_tat},
+            where=new_tat - rule.period <= now,
+        )
+        .returning(RateLimitBucket.tat)
+    )
+
+
+class PostgresRateLimitBackend:
+    def __init__(self, purge_seconds: float = 60) -> None:
+        self.purge_seconds = purge_seconds
+        self.last_purge = 0.0
+
+    async def hit(self, key: str, rule: RateLimit, now: float | None = None) -> RateLimitResult:
+        from ..database import AsyncSessionLocal
+
+        now = time.time() if now is None else now
+        async with AsyncSessionLocal() as db:
+            if await db.scalar(gcra_statement(key, now, rule)) is not None:
+                result = RateLimitResult(True)
+            else:
+                tat = await db.scalar(select(RateLimitBucket.tat).where(RateLimitBucket.key == key))
+                result = RateLimitResult(False, max(0.0, (tat or now) + rule.interval - rule.period - now))
+            if now - self.last_purge >= self.purge_seconds:
+                self.last_purge = now
+                await db.execute(delete(RateLimitBucket).where(RateLimitBucket.tat < now))
+            await db.commit()
+        return result
+
+
+def route_rules() -> list[tuple[str | None, re.Pattern[str], RateLimit]]:
+    settings = get_settings()
+    return [
+        (None, re.compile(r"^/api/auth/"), RateLimit("auth", settings.auth_rate_limit_per_minute, per_path=True, message="Too many authentication attempts")),
+        ("POST", re.compile(r"^/api/(discover/swipe|swipes/rewind)"), RateLimit("swipe", settings.swipe_rate_limit_per_minute)),
+        ("POST", re.compile(r"^/api/conversations/[^/]+/messages$"), RateLimit("messages", settings.message_rate_limit_per_minute)),
+        ("POST", re.compile(r"^/api/location/search$"), RateLimit("geocode", settings.geocode_rate_limit_per_minute)),
+        ("POST", re.compile(r"^/api/profile/photos"), RateLimit("uploads", settings.upload_rate_limit_per_minute)),
+    ]
+
+
+def match_rule(rules: list[tuple[str | None, re.Pattern[str], RateLimit]], method: str, path: str) -> RateLimit | None:
+    for rule_method, pattern, rule in rules:
+        if (rule_method is None or rule_method == method) and pattern.match(path):
+            return rule
+    return None
+
+
+def rate_limit_key(rule: RateLimit, path: str, client_host: str, subject: str | None) -> str:
+    identity = f"user:{subject}" if subject and not rule.per_path else f"ip:{client_host}"
+    return f"{rule.group}:{identity}:{path}" if rule.per_path else f"{rule.group}:{identity}"
+
+
+def create_rate_limit_backend() -> Any:
+    settings = get_settings()
+    if settings.rate_limit_backend == "postgres":
+        return PostgresRateLimitBackend()
+    return MemoryRateLimitBackend(max_keys=settings.rate_limit_max_keys)
@@ -1,24 +1,185 @@
-from collections import defaultdict
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
 from typing import Any
 import uuid
 
 from fastapi import WebSocket
 
+from ..config import get_settings
 
-class ConnectionManager:
+logger = logging.getLogger("flinder.realtime")
+
+Handler = Callable[[uuid.UUID, dict[str, Any]], Awaitable[None]]
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+def channel_name(chat_id: uuid.UUID) -> str:
+    return f"chat_{chat_id.hex}"
+
+
+class LocalBroker:
     def __init__(self) -> None:
+        self.handlers: dict[uuid.UUID, list[Handler]] = defaultdict(list)
+
+    async def subscribe(self, chat_id: uuid.UUID, handler: Handler) -> None:
+        self.handlers[chat_id].append(handler)
+
+    async def unsubscribe(self, chat_id: uuid.UUID, handler: Handler) -> None:
+        handlers = self.handlers.get(chat_id, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self.handlers.pop(chat_id, None)
+
+    async def publish(self, chat_id: uuid.UUID, envelope: dict[str, Any]) -> None:
+        for handler in list(self.handlers.get(chat_id, [])):
+            await handler(chat_id, envelope)
+
+    async def stop(self) -> None:
+        self.handlers.clear()
+
+
+class PostgresBroker:
+    def __init__(self, url: str, poll_seconds: float = 1.0, listen_window: float = 0.1) -> None:
+        self.url = url.replace("postgresql+psycopg://", "postgresql://", 1)
+        self.poll_seconds = poll_seconds
+        self.listen_window = listen_window
+        self.handlers: dict[uuid.UUID, Handler] = {}
+        self.commands: asyncio.Queue[tuple[str, uuid.UUID]] = asyncio.Queue()
+        self.events: asyncio.Queue[tuple[str, str]] = asyncio.Queue()
+        self.listener: Any = None
+        self.publisher: Any = None
+        self.tasks: list[asyncio.Task] = []
+        self.connect_lock = asyncio.Lock()
+
+    async def _connect(self) -> None:
+        import psycopg
+
+        async with self.connect_lock:
+            if self.publisher is None or self.publisher.closed:
+                self.publisher = await psycopg.AsyncConnection.connect(self.url, autocommit=True)
+            if self.listener is None or self.listener.closed:
+                self.listener = await psycopg.AsyncConnection.connect(self.url, autocommit=True)
+                for chat_id in list(self.handlers):
+                    await self.listener.execute(f'LISTEN "{channel_name(chat_id)}"')
+            if not self.tasks:
+                self.tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._consume())]
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self._connect()
+                while not self.commands.empty():
+                    action, chat_id = self.commands.get_nowait()
+                    await self.listener.execute(f'{action} "{channel_name(chat_id)}"')
+                async for notify in self.listener.notifies(timeout=self.listen_window):
+                    self.events.put_nowait((notify.channel, notify.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime listener failed; reconnecting")
+                if self.listener is not None and not self.listener.closed:
+                    await self.listener.close()
+                await asyncio.sleep(self.poll_seconds)
+
+    async def _consume(self) -> None:
+        while True:
+            channel, payload = await self.events.get()
+            try:
+                await self._dispatch(channel, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Realtime dispatch failed for %s", channel)
+
+    async def _dispatch(self, channel: str, payload: str) -> None:
+        chat_id = uuid.UUID(hex=channel.removeprefix("chat_"))
+        handler = self.handlers.get(chat_id)
+        if not handler:
+            return
+        envelope = json.loads(payload)
+        if "eventId" in envelope:
+            cursor = await self.publisher.execute("select payload from realtime_events where id = %s", (envelope["eventId"],))
+            row = await cursor.fetchone()
+            if not row:
+                return
+            envelope = {"origin": envelope["origin"], "payload": row[0]}
+        await handler(chat_id, envelope)
+
+    async def subscribe(self, chat_id: uuid.UUID, handler: Handler) -> None:
+        self.handlers[chat_id] = handler
+        self.commands.put_nowait(("LISTEN", chat_id))
+        await self._connect()
+
+    async def unsubscribe(self, chat_id: uuid.UUID, handler: Handler) -> None:
+        if self.handlers.pop(chat_id, None):
+            self.commands.put_nowait(("UNLISTEN", chat_id))
+
+    async def publish(self, chat_id: uuid.UUID, envelope: dict[str, Any]) -> None:
+        await self._connect()
+        payload = json.dumps(envelope, separators=(",", ":"))
+        if len(payload.encode("utf-8")) > NOTIFY_PAYLOAD_LIMIT:
+            cursor = await self.publisher.execute(
+                "insert into realtime_events (payload) values (%s) returning id",
+                (json.dumps(envelope["payload"]),),
+            )
+            event_id = (await cursor.fetchone())[0]
+            await self.publisher.execute("delete from realtime_events where created_at < now() - interval '5 minutes'")
+            payload = json.dumps({"origin": envelope["origin"], "eventId": event_id})
+        await self.publisher.execute("select pg_notify(%s, %s)", (channel_name(chat_id), payload))
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        for connection in (self.listener, self.publisher):
+            if connection is not None and not connection.closed:
+                await connection.close()
+
+
+class ConnectionManager:
+    def __init__(self, broker: Any | None = None) -> None:
         self.rooms: dict[uuid.UUID, set[WebSocket]] = defaultdict(set)
+        self.sockets: dict[WebSocket, uuid.UUID | None] = {}
+        self.present: dict[uuid.UUID, Counter[uuid.UUID]] = defaultdict(Counter)
+        self.broker = broker or LocalBroker()
+        self.node_id = uuid.uuid4().hex
 
-    async def connect(self, chat_id: uuid.UUID, websocket: WebSocket) -> None:
+    async def connect(self, chat_id: uuid.UUID, websocket: WebSocket, user_id: uuid.UUID | None = None) -> None:
         await websocket.accept()
+        first = not self.rooms.get(chat_id)
         self.rooms[chat_id].add(websocket)
+        self.sockets[websocket] = user_id
+        if user_id:
+            self.present[chat_id][user_id] += 1
+        if first:
+            await self.broker.subscribe(chat_id, self.relay)
 
-    def disconnect(self, chat_id: uuid.UUID, websocket: WebSocket) -> None:
-        self.rooms[chat_id].discard(websocket)
-        if not self.rooms[chat_id]:
+    async def disconnect(self, chat_id: uuid.UUID, websocket: WebSocket) -> None:
+        sockets = self.rooms.get(chat_id)
+        if sockets is None or websocket not in sockets:
+            return
+        sockets.discard(websocket)
+        user_id = self.sockets.pop(websocket, None)
+        if user_id:
+            self.present[chat_id][user_id] -= 1
+            if self.present[chat_id][user_id] <= 0:
+                del self.present[chat_id][user_id]
+        if not self.present.get(chat_id, True):
+            del self.present[chat_id]
+        if not sockets:
             del self.rooms[chat_id]
+            await self.broker.unsubscribe(chat_id, self.relay)
 
-    async def broadcast(self, chat_id: uuid.UUID, payload: dict[str, Any]) -> None:
+    def is_connected(self, chat_id: uuid.UUID, user_id: uuid.UUID) -> bool:
+        return bool(self.present.get(chat_id, {}).get(user_id))
+
+    async def deliver(self, chat_id: uuid.UUID, payload: dict[str, Any]) -> None:
         dead: list[WebSocket] = []
         for websocket in list(self.rooms.get(chat_id, set())):
             try:
@@ -26,7 +187,25 @@ class ConnectionManager:
             except Exception:
                 dead.append(websocket)
         for websocket in dead:
-            self.disconnect(chat_id, websocket)
+            await self.disconnect(chat_id, websocket)
+
+    async def relay(self, chat_id: uuid.UUID, envelope: dict[str, Any]) -> None:
+        if envelope.get("origin") != self.node_id:
+            await self.deliver(chat_id, envelope["payload"])
+
+    async def broadcast(self, chat_id: uuid.UUID, payload: dict[str, Any]) -> None:
+        await self.deliver(chat_id, payload)
+        try:
+            await self.broker.publish(chat_id, {"origin": self.node_id, "payload": payload})
+        except Exception:
+            logger.exception("Realtime publish failed for chat %s", chat_id)
+
+
+def create_broker() -> Any:
+    settings = get_settings()
+    if settings.realtime_broker == "postgres":
+        return PostgresBroker(settings.realtime_database_url or settings.database_url)
+    return LocalBroker()
 
 
-manager = ConnectionManager()
+manager = ConnectionManager(create_broker())
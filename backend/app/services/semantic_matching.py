@@ -3,19 +3,27 @@ from __future__ import annotations
 import hashlib
 import json
 import math
+import struct
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from types import SimpleNamespace
 from typing import Any
 
 import httpx
+import numpy as np
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, defer
 
 from ..config import get_settings
 from ..models import Preference, Profile, UserEmbedding
+from .deck_cache import deck_cache
+from .embedding_cache import embedding_cache
 
 
 CATEGORIES = ("hobbies", "interests", "traits", "personality", "likes", "dislikes")
+PACKED_DTYPES = {"float16": 1, "int8": 2}
 CATEGORY_WEIGHTS = {
     "hobbies": 0.10,
     "interests": 0.20,
@@ -179,7 +187,7 @@ def build_canonical_texts(profile: Profile, preference: Preference | None, llm_t
 
 
 def cosine_similarity(left: list[float] | None, right: list[float] | None) -> float:
-    if not left or not right or len(left) != len(right):
+    if left is None or right is None or not len(left) or len(left) != len(right):
         return 0.0
     dot = sum(a * b for a, b in zip(left, right))
     left_norm = math.sqrt(sum(a * a for a in left))
@@ -193,22 +201,21 @@ def semantic_similarity(current: UserEmbedding | None, candidate: UserEmbedding
     if not current or not candidate or current.status != "ready" or candidate.status != "ready":
         return {"available": False, "score": 0, "categoryScores": {}, "conflictPenalty": 0}
 
+    current_vectors = category_vectors(current)
+    candidate_vectors = category_vectors(candidate)
     category_scores: dict[str, float] = {}
     weighted = 0.0
     total_weight = 0.0
     for category in CATEGORIES:
-        score = cosine_similarity(
-            getattr(current, f"embedding_{category}", None),
-            getattr(candidate, f"embedding_{category}", None),
-        )
+        score = cosine_similarity(current_vectors[category], candidate_vectors[category])
         normalized = (score + 1) / 2
         category_scores[category] = round(normalized, 4)
         weighted += normalized * CATEGORY_WEIGHTS[category]
         total_weight += CATEGORY_WEIGHTS[category]
 
     conflict = 0.0
-    conflict += max(0.0, cosine_similarity(current.embedding_likes, candidate.embedding_dislikes))
-    conflict += max(0.0, cosine_similarity(current.embedding_dislikes, candidate.embedding_likes))
+    conflict += max(0.0, cosine_similarity(current_vectors["likes"], candidate_vectors["dislikes"]))
+    conflict += max(0.0, cosine_similarity(current_vectors["dislikes"], candidate_vectors["likes"]))
     conflict = min(1.0, conflict * CONFLICT_WEIGHT)
     final = max(0.0, min(1.0, (weighted / total_weight if total_weight else 0.0) - conflict))
     return {
@@ -219,10 +226,202 @@ def semantic_similarity(current: UserEmbedding | None, candidate: UserEmbedding
     }
 
 
-def mark_embedding_stale(db: Session, user_id: uuid.UUID) -> None:
+def quantize(vector: Any, dtype: str) -> tuple[np.ndarray, float]:
+    values = np.asarray(vector, dtype=np.float32)
+    if dtype == "float16":
+        return values.astype(np.float16), 1.0
+    if dtype == "int8":
+        peak = float(np.max(np.abs(values))) if values.size else 0.0
+        scale = peak / 127 if peak else 1.0
+        return np.clip(np.rint(values / scale), -127, 127).astype(np.int8), scale
+    return values, 1.0
+
+
+def pack_embeddings(vectors: dict[str, Any], dtype: str) -> bytes:
+    present = [category for category in CATEGORIES if vectors.get(category) is not None and len(vectors[category])]
+    dim = len(vectors[present[0]]) if present else 0
+    mask = sum(1 << CATEGORIES.index(category) for category in present)
+    parts = [struct.pack("<BHB", PACKED_DTYPES[dtype], dim, mask)]
+    for category in present:
+        values, scale = quantize(vectors[category], dtype)
+        if dtype == "int8":
+            parts.append(struct.pack("<f", scale))
+        parts.append(values.tobytes())
+    return b"".join(parts)
+
+
+def unpack_embeddings(blob: bytes) -> dict[str, np.ndarray | None]:
+    code, dim, mask = struct.unpack_from("<BHB", blob)
+    dtype = next(name for name, value in PACKED_DTYPES.items() if value == code)
+    offset = struct.calcsize("<BHB")
+    vectors: dict[str, np.ndarray | None] = {category: None for category in CATEGORIES}
+    for position, category in enumerate(CATEGORIES):
+        if not mask & (1 << position):
+            continue
+        if dtype == "int8":
+            (scale,) = struct.unpack_from("<f", blob, offset)
+            offset += 4
+            vectors[category] = np.frombuffer(blob, dtype=np.int8, count=dim, offset=offset).astype(np.float32) * scale
+            offset += dim
+        else:
+            vectors[category] = np.frombuffer(blob, dtype=np.float16, count=dim, offset=offset).astype(np.float32)
+            offset += 2 * dim
+    return vectors
+
+
+def category_vectors(row: Any) -> dict[str, Any]:
+    packed = getattr(row, "embedding_packed", None)
+    if not packed or not get_settings().embedding_compact_dtype:
+        return {category: getattr(row, f"embedding_{category}", None) for category in CATEGORIES}
+    unpacked = getattr(row, "_unpacked_embeddings", None)
+    if unpacked is None or unpacked[0] is not packed:
+        unpacked = (packed, unpack_embeddings(packed))
+        row._unpacked_embeddings = unpacked
+    return unpacked[1]
+
+
+def category_vector(row: Any, category: str) -> Any:
+    return category_vectors(row)[category]
+
+
+def embedding_load_options() -> list:
+    if not get_settings().embedding_compact_dtype:
+        return []
+    return [defer(getattr(UserEmbedding, f"embedding_{category}")) for category in CATEGORIES]
+
+
+def _category_matrix(rows: list[UserEmbedding], category: str, dim: int) -> tuple[np.ndarray, np.ndarray]:
+    matrix = np.zeros((len(rows), dim), dtype=np.float64)
+    present = np.zeros(len(rows), dtype=bool)
+    for index, row in enumerate(rows):
+        vector = category_vector(row, category)
+        if vector is not None and len(vector) == dim:
+            matrix[index] = vector
+            present[index] = True
+    return matrix, present
+
+
+def _batch_cosine(query: Any, rows: list[UserEmbedding], category: str) -> np.ndarray:
+    if query is None or not len(query) or not rows:
+        return np.zeros(len(rows), dtype=np.float64)
+    query_vector = np.asarray(query, dtype=np.float64)
+    query_norm = float(np.linalg.norm(query_vector))
+    if not query_norm:
+        return np.zeros(len(rows), dtype=np.float64)
+    matrix, present = _category_matrix(rows, category, len(query_vector))
+    norms = np.linalg.norm(matrix, axis=1)
+    valid = present & (norms > 0)
+    scores = np.zeros(len(rows), dtype=np.float64)
+    scores[valid] = (matrix[valid] @ query_vector) / (norms[valid] * query_norm)
+    return np.clip(scores, -1.0, 1.0)
+
+
+def semantic_similarity_batch(
+    current: UserEmbedding | None,
+    candidates: list[UserEmbedding | None],
+) -> list[dict[str, Any]]:
+    unavailable = {"available": False, "score": 0, "categoryScores": {}, "conflictPenalty": 0}
+    if not current or current.status != "ready":
+        return [dict(unavailable) for _ in candidates]
+
+    ready_positions = [index for index, row in enumerate(candidates) if row and row.status == "ready"]
+    ready_rows = [candidates[index] for index in ready_positions]
+    current_vectors = category_vectors(current)
+    category_normalized = {
+        category: (_batch_cosine(current_vectors[category], ready_rows, category) + 1) / 2 for category in CATEGORIES
+    }
+    total_weight = sum(CATEGORY_WEIGHTS[category] for category in CATEGORIES)
+    weighted = sum(category_normalized[category] * CATEGORY_WEIGHTS[category] for category in CATEGORIES)
+    conflict = np.maximum(0.0, _batch_cosine(current_vectors["likes"], ready_rows, "dislikes"))
+    conflict = conflict + np.maximum(0.0, _batch_cosine(current_vectors["dislikes"], ready_rows, "likes"))
+    conflict = np.minimum(1.0, conflict * CONFLICT_WEIGHT)
+    final = np.clip((weighted / total_weight if total_weight else 0.0) - conflict, 0.0, 1.0)
+
+    results = [dict(unavailable) for _ in candidates]
+    for offset, position in enumerate(ready_positions):
+        results[position] = {
+            "available": True,
+            "score": round(float(final[offset]) * 60),
+            "categoryScores": {
+                category: round(float(category_normalized[category][offset]), 4) for category in CATEGORIES
+            },
+            "conflictPenalty": round(float(conflict[offset]), 4),
+        }
+    return results
+
+
+def _weighted_score(result: dict[str, Any]) -> float:
+    if not result["available"]:
+        return 0.0
+    total_weight = sum(CATEGORY_WEIGHTS.values())
+    weighted = sum(result["categoryScores"][category] * CATEGORY_WEIGHTS[category] for category in CATEGORIES) / total_weight
+    return weighted - result["conflictPenalty"]
+
+
+def quantized_copy(row: UserEmbedding, dtype: str) -> SimpleNamespace:
+    vectors = unpack_embeddings(pack_embeddings({category: getattr(row, f"embedding_{category}", None) for category in CATEGORIES}, dtype))
+    return SimpleNamespace(
+        status=row.status,
+        **{f"embedding_{category}": vector.tolist() if vector is not None else None for category, vector in vectors.items()},
+    )
+
+
+def quantization_report(rows: list[UserEmbedding], dtype: str, top_k: int = 10) -> dict[str, Any]:
+    ready = [row for row in rows if row.status == "ready"]
+    compact = [quantized_copy(row, dtype) for row in ready]
+    overlaps = []
+    score_errors = []
+    for position, query in enumerate(ready):
+        candidates = ready[:position] + ready[position + 1 :]
+        compact_candidates = compact[:position] + compact[position + 1 :]
+        if not candidates:
+            continue
+        exact = [_weighted_score(result) for result in semantic_similarity_batch(query, candidates)]
+        approximate = [_weighted_score(result) for result in semantic_similarity_batch(compact[position], compact_candidates)]
+        k = min(top_k, len(candidates))
+        exact_top = set(np.argsort(exact)[::-1][:k].tolist())
+        approximate_top = set(np.argsort(approximate)[::-1][:k].tolist())
+        overlaps.append(len(exact_top & approximate_top) / k)
+        score_errors.append(float(np.max(np.abs(np.asarray(exact) - np.asarray(approximate)))))
+    agreement = float(np.mean(overlaps)) if overlaps else 1.0
+    return {
+        "dtype": dtype,
+        "profiles": len(ready),
+        "topK": top_k,
+        "rankingAgreement": round(agreement, 4),
+        "maxScoreError": round(max(score_errors), 6) if score_errors else 0.0,
+        "bytesPerProfile": len(pack_embeddings({category: getattr(ready[0], f"embedding_{category}", None) for category in CATEGORIES}, dtype)) if ready else 0,
+        "passed": agreement >= get_settings().embedding_compact_min_agreement,
+    }
+
+
+def combined_embedding(row: UserEmbedding | None) -> np.ndarray | None:
+    if not row:
+        return None
+    vectors = category_vectors(row)
+    dim = next((len(vector) for vector in vectors.values() if vector is not None and len(vector)), 0)
+    if not dim:
+        return None
+    total_weight = sum(CATEGORY_WEIGHTS.values())
+    parts = []
+    for category in CATEGORIES:
+        part = np.zeros(dim, dtype=np.float32)
+        vector = vectors[category]
+        if vector is not None and len(vector) == dim:
+            values = np.asarray(vector, dtype=np.float32)
+            norm = float(np.linalg.norm(values))
+            if norm:
+                part = values / norm * math.sqrt(CATEGORY_WEIGHTS[category] / total_weight)
+        parts.append(part)
+    return np.concatenate(parts)
+
+
+def mark_embedding_stale(db: Session, user_id: uuid.UUID) -> bool:
+    deck_cache.invalidate(user_id)
+    deck_cache.remove_user_everywhere(user_id)
     profile = db.get(Profile, user_id)
     if not profile:
-        return
+        return False
     preference = db.scalar(select(Preference).where(Preference.user_id == user_id))
     current_hash = source_hash(profile, preference)
     row = db.get(UserEmbedding, user_id)
@@ -233,29 +432,8 @@ def mark_embedding_stale(db: Session, user_id: uuid.UUID) -> None:
         row.source_hash = current_hash
         row.status = "stale"
         row.error = None
-
-
-def trigger_embedding_rebuild(user_id: uuid.UUID) -> None:
-    settings = get_settings()
-    if not settings.ml_worker_url or not settings.ml_worker_token:
-        return
-    if settings.ml_worker_mode.lower() == "gradio":
-        try:
-            from gradio_client import Client
-
-            client = Client(settings.ml_worker_url, hf_token=settings.hf_token or None, verbose=False)
-            client.submit(str(user_id), settings.ml_worker_token, api_name="/rebuild_profile")
-        except Exception:
-            return
-        return
-    try:
-        httpx.post(
-            f"{settings.ml_worker_url.rstrip('/')}/internal/ml/profiles/{user_id}/rebuild",
-            headers={"X-ML-Worker-Token": settings.ml_worker_token},
-            timeout=1.5,
-        )
-    except Exception:
-        return
+        return True
+    return False
 
 
 def _load_model():
@@ -272,41 +450,170 @@ def _load_model():
 @spaces.GPU(duration=60)
 def _encode_texts(texts: list[str]):
     model = _load_model()
-    return model.encode(texts, normalize_embeddings=True)
+    return model.encode(texts, batch_size=get_settings().semantic_encode_batch_size, normalize_embeddings=True)
 
 
-def rebuild_user_embedding(db: Session, user_id: uuid.UUID) -> UserEmbedding:
-    profile = db.get(Profile, user_id)
-    if not profile:
-        raise ValueError("Profile not found")
-    preference = db.scalar(select(Preference).where(Preference.user_id == user_id))
-    row = db.get(UserEmbedding, user_id) or UserEmbedding(user_id=user_id)
-    db.add(row)
-    current_hash = source_hash(profile, preference)
+def encode_texts(db: Session | None, texts: list[str]):
+    settings = get_settings()
+    if not settings.embedding_cache_enabled or not texts:
+        return _encode_texts(texts)
+    return embedding_cache.encode(
+        db if settings.embedding_cache_persist else None,
+        settings.semantic_model_name,
+        texts,
+        _encode_texts,
+    )
 
+
+def _fetch_traits_safely(profile: Profile, preference: Preference | None) -> dict[str, Any]:
     try:
-        llm_traits = fetch_llm_traits(profile, preference)
+        return fetch_llm_traits(profile, preference)
     except Exception as exc:
-        llm_traits = {"_error": str(exc)}
+        return {"_error": str(exc)}
+
+
+def build_embedding_values(
+    user_ids: list[uuid.UUID],
+    profiles: dict[uuid.UUID, Profile],
+    preferences: dict[uuid.UUID, Preference],
+    llm_traits: dict[uuid.UUID, dict[str, Any]],
+    texts: dict[uuid.UUID, dict[str, str]],
+    vectors: Any | None,
+    error: str | None = None,
+    metadata: dict[uuid.UUID, dict[str, Any]] | None = None,
+) -> list[dict[str, Any]]:
+    settings = get_settings()
+    now = datetime.now(timezone.utc)
+    values = []
+    for position, user_id in enumerate(user_ids):
+        value: dict[str, Any] = {
+            "user_id": user_id,
+            "source_hash": source_hash(profiles[user_id], preferences.get(user_id)),
+            "llm_traits": llm_traits[user_id],
+            "canonical_text": texts[user_id],
+            **(metadata or {}).get(user_id, {}),
+        }
+        if vectors is None:
+            value.update(status="failed", error=error)
+            values.append(value)
+            continue
+        for offset, category in enumerate(CATEGORIES):
+            vector = vectors[position * len(CATEGORIES) + offset]
+            value[f"embedding_{category}"] = [float(item) for item in vector.tolist()]
+        if settings.pgvector_enabled:
+            combined = combined_embedding(SimpleNamespace(**value))
+            value["embedding_combined"] = combined.tolist() if combined is not None else None
+        if settings.embedding_compact_dtype:
+            value["embedding_packed"] = pack_embeddings(
+                {category: value[f"embedding_{category}"] for category in CATEGORIES},
+                settings.embedding_compact_dtype,
+            )
+        value.update(
+            model_name=settings.semantic_model_name,
+            status="ready",
+            error=None,
+            last_embedded_at=now,
+        )
+        values.append(value)
+    return values
+
+
+def _upsert_embeddings(db: Session, values: list[dict[str, Any]]) -> list[UserEmbedding]:
+    if not values:
+        return []
+    statement = pg_insert(UserEmbedding).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[UserEmbedding.user_id],
+        set_={key: statement.excluded[key] for key in values[0] if key != "user_id"},
+    )
+    return list(
+        db.scalars(
+            statement.returning(UserEmbedding),
+            execution_options={"populate_existing": True},
+        ).all()
+    )
+
+
+def llm_refresh_reason(row: UserEmbedding | None, current_hash: str, force: bool = False) -> tuple[bool, str]:
+    if force:
+        return True, "forced"
+    if not row or not row.llm_traits or "_error" in row.llm_traits or not row.canonical_text:
+        return True, "no_cached_traits"
+    if row.llm_version != get_settings().llm_traits_version:
+        return True, "llm_version_changed"
+    if row.llm_source_hash != current_hash:
+        return True, "source_changed"
+    return False, "source_unchanged"
+
+
+def rebuild_user_embeddings(db: Session, user_ids: list[uuid.UUID], force_llm: bool = False) -> list[UserEmbedding]:
+    settings = get_settings()
+    requested = list(dict.fromkeys(user_ids))
+    profiles = {
+        profile.user_id: profile
+        for profile in db.scalars(select(Profile).where(Profile.user_id.in_(requested))).all()
+    }
+    user_ids = [user_id for user_id in requested if user_id in profiles]
+    if not user_ids:
+        return []
+    preferences = {
+        preference.user_id: preference
+        for preference in db.scalars(select(Preference).where(Preference.user_id.in_(user_ids))).all()
+    }
+    existing = {
+        row.user_id: row
+        for row in db.scalars(select(UserEmbedding).where(UserEmbedding.user_id.in_(user_ids))).all()
+    }
+    hashes = {user_id: source_hash(profiles[user_id], preferences.get(user_id)) for user_id in user_ids}
+    decisions = {user_id: llm_refresh_reason(existing.get(user_id), hashes[user_id], force_llm) for user_id in user_ids}
+    refresh = [user_id for user_id in user_ids if decisions[user_id][0]]
+
+    llm_traits = {user_id: existing[user_id].llm_traits for user_id in user_ids if not decisions[user_id][0]}
+    if refresh:
+        with ThreadPoolExecutor(max_workers=max(1, min(settings.ml_llm_concurrency, len(refresh)))) as pool:
+            traits = list(pool.map(_fetch_traits_safely, [profiles[user_id] for user_id in refresh], [preferences.get(user_id) for user_id in refresh]))
+        llm_traits.update(zip(refresh, traits))
+    texts = {
+        user_id: existing[user_id].canonical_text
+        if not decisions[user_id][0]
+        else build_canonical_texts(
+            profiles[user_id],
+            preferences.get(user_id),
+            llm_traits[user_id] if "_error" not in llm_traits[user_id] else {},
+        )
+        for user_id in user_ids
+    }
+    metadata = {}
+    for user_id in user_ids:
+        called, reason = decisions[user_id]
+        failed = "_error" in llm_traits[user_id]
+        metadata[user_id] = {
+            "llm_source_hash": None if failed else hashes[user_id],
+            "llm_version": settings.llm_traits_version,
+            "rebuild_reason": f"{'llm_failed' if failed else 'llm_called' if called else 'llm_skipped'}:{reason}",
+        }
 
-    texts = build_canonical_texts(profile, preference, llm_traits if "_error" not in llm_traits else {})
     try:
-        vectors = _encode_texts([texts[category] for category in CATEGORIES])
-        for category, vector in zip(CATEGORIES, vectors):
-            setattr(row, f"embedding_{category}", [float(value) for value in vector.tolist()])
-        row.model_name = get_settings().semantic_model_name
-        row.source_hash = current_hash
-        row.llm_traits = llm_traits
-        row.canonical_text = texts
-        row.status = "ready"
-        row.error = None
-        row.last_embedded_at = datetime.now(timezone.utc)
+        vectors = encode_texts(db, [texts[user_id][category] for user_id in user_ids for category in CATEGORIES])
+        error = None
     except Exception as exc:
-        row.source_hash = current_hash
-        row.llm_traits = llm_traits
-        row.canonical_text = texts
-        row.status = "failed"
-        row.error = str(exc)
+        vectors = None
+        error = str(exc)
+
+    values = build_embedding_values(user_ids, profiles, preferences, llm_traits, texts, vectors, error, metadata)
+    rows = {row.user_id: row for row in _upsert_embeddings(db, values)}
     db.commit()
-    db.refresh(row)
-    return row
+
+    from .candidate_index import upsert_candidate_vector
+
+    for row in rows.values():
+        if row.status == "ready":
+            upsert_candidate_vector(row)
+    return [rows[user_id] for user_id in user_ids if user_id in rows]
+
+
+def rebuild_user_embedding(db: Session, user_id: uuid.UUID, force_llm: bool = False) -> UserEmbedding:
+    rows = rebuild_user_embeddings(db, [user_id], force_llm=force_llm)
+    if not rows:
+        raise ValueError("Profile not found")
+    return rows[0]
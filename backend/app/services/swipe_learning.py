@@ -1,24 +1,31 @@
 from __future__ import annotations
 
 import uuid
+from datetime import datetime, timezone
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from ..models import Swipe, UserEmbedding
-from .semantic_matching import CATEGORIES, cosine_similarity
+from ..config import get_settings
+from ..models import Swipe, SwipePreferenceState, UserEmbedding
+from .semantic_matching import CATEGORIES, category_vectors, cosine_similarity, embedding_load_options
 
 MIN_SIGNAL_SWIPES = 4
 MAX_LEARNING_POINTS = 15
+SWIPE_WEIGHTS = {"like": 1.0, "pass": -0.35}
+SWIPE_HORIZON = 200
+SWIPE_DECAY = 1 - 1 / SWIPE_HORIZON
+SEED_SWIPES = 5 * SWIPE_HORIZON
 
 
 def _empty_vector(size: int) -> list[float]:
     return [0.0 for _ in range(size)]
 
 
-def _add_scaled(target: list[float], source: list[float] | None, weight: float) -> None:
-    if not source or len(target) != len(source):
+def _add_scaled(target: list[float], source: Any, weight: float) -> None:
+    if source is None or len(target) != len(source):
         return
     for index, value in enumerate(source):
         target[index] += float(value) * weight
@@ -31,79 +38,172 @@ def _normalize(vector: list[float]) -> list[float] | None:
     return [value / norm for value in vector]
 
 
-def build_swipe_preference_model(db: Session, user_id: uuid.UUID, limit: int = 200) -> dict[str, Any]:
+def _decay_factor(elapsed_seconds: float) -> float:
+    half_life_days = get_settings().swipe_learning_half_life_days
+    if half_life_days <= 0 or elapsed_seconds <= 0:
+        return 1.0
+    return 0.5 ** (elapsed_seconds / (half_life_days * 86400))
+
+
+def decay_state(state: SwipePreferenceState, now: datetime) -> None:
+    if state.decayed_at:
+        factor = _decay_factor((now - state.decayed_at).total_seconds())
+        if factor != 1.0:
+            for category in CATEGORIES:
+                accumulator = getattr(state, f"accumulator_{category}", None)
+                if accumulator:
+                    setattr(state, f"accumulator_{category}", [value * factor for value in accumulator])
+    state.decayed_at = now
+
+
+def apply_swipe_signal(
+    state: SwipePreferenceState,
+    embedding: UserEmbedding | None,
+    action: str,
+    now: datetime,
+    swiped_at: datetime | None = None,
+) -> None:
+    decay_state(state, now)
+    for category in CATEGORIES:
+        accumulator = getattr(state, f"accumulator_{category}", None)
+        if accumulator:
+            setattr(state, f"accumulator_{category}", [value * SWIPE_DECAY for value in accumulator])
+    if not embedding or embedding.status != "ready" or action not in SWIPE_WEIGHTS:
+        return
+    weight = SWIPE_WEIGHTS[action] * _decay_factor((now - (swiped_at or now)).total_seconds())
+    sources = category_vectors(embedding)
+    for category in CATEGORIES:
+        source = sources[category]
+        if source is None or not len(source):
+            continue
+        accumulator = list(getattr(state, f"accumulator_{category}", None) or _empty_vector(len(source)))
+        _add_scaled(accumulator, source, weight)
+        setattr(state, f"accumulator_{category}", accumulator)
+
+
+def count_swipe(state: SwipePreferenceState, action: str) -> None:
+    if action == "like":
+        state.like_count = (state.like_count or 0) + 1
+    else:
+        state.pass_count = (state.pass_count or 0) + 1
+
+
+def state_to_model(state: SwipePreferenceState) -> dict[str, Any]:
+    vectors: dict[str, list[float]] = {}
+    for category in CATEGORIES:
+        accumulator = getattr(state, f"accumulator_{category}", None)
+        normalized = _normalize(accumulator) if accumulator else None
+        if normalized:
+            vectors[category] = normalized
+    like_count = state.like_count or 0
+    pass_count = state.pass_count or 0
+    available = bool(vectors) and (like_count + pass_count) >= MIN_SIGNAL_SWIPES and like_count > 0
+    return {
+        "available": available,
+        "likeCount": like_count,
+        "passCount": pass_count,
+        "vectors": vectors,
+    }
+
+
+def seed_swipe_preference_state(db: Session, user_id: uuid.UUID, limit: int | None = None) -> SwipePreferenceState:
+    state = SwipePreferenceState(user_id=user_id, like_count=0, pass_count=0)
     swipes = db.scalars(
         select(Swipe)
         .where(Swipe.user_id == user_id)
         .order_by(Swipe.created_at.desc())
-        .limit(limit)
+        .limit(limit or SEED_SWIPES)
     ).all()
     if not swipes:
-        return {"available": False, "likeCount": 0, "passCount": 0, "vectors": {}}
+        return state
 
+    counts = dict(
+        db.execute(select(Swipe.action, func.count()).where(Swipe.user_id == user_id).group_by(Swipe.action)).all()
+    )
+    state.like_count = counts.get("like", 0)
+    state.pass_count = sum(count for action, count in counts.items() if action != "like")
     target_ids = [swipe.target_user_id for swipe in swipes]
     embeddings = {
         row.user_id: row
         for row in db.scalars(
-            select(UserEmbedding).where(
+            select(UserEmbedding)
+            .where(
                 UserEmbedding.user_id.in_(target_ids),
                 UserEmbedding.status == "ready",
             )
+            .options(*embedding_load_options())
         ).all()
     }
-    if not embeddings:
-        return {"available": False, "likeCount": 0, "passCount": 0, "vectors": {}}
-
-    vectors: dict[str, list[float]] = {}
-    like_count = 0
-    pass_count = 0
-    for category in CATEGORIES:
-        sample = next(
-            (
-                getattr(row, f"embedding_{category}", None)
-                for row in embeddings.values()
-                if getattr(row, f"embedding_{category}", None)
-            ),
-            None,
+    now = datetime.now(timezone.utc)
+    for swipe in reversed(swipes):
+        apply_swipe_signal(state, embeddings.get(swipe.target_user_id), swipe.action, now, swiped_at=swipe.created_at)
+    return state
+
+
+def store_swipe_preference_state(db: Session, state: SwipePreferenceState) -> None:
+    values = {
+        "user_id": state.user_id,
+        **{f"accumulator_{category}": getattr(state, f"accumulator_{category}", None) for category in CATEGORIES},
+        "like_count": state.like_count or 0,
+        "pass_count": state.pass_count or 0,
+        "decayed_at": state.decayed_at,
+    }
+    statement = pg_insert(SwipePreferenceState).values(**values)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[SwipePreferenceState.user_id],
+            set_={**{key: statement.excluded[key] for key in values if key != "user_id"}, "updated_at": func.now()},
         )
-        if not sample:
-            continue
-        accumulator = _empty_vector(len(sample))
-        for swipe in swipes:
-            embedding = embeddings.get(swipe.target_user_id)
-            if not embedding:
-                continue
-            source = getattr(embedding, f"embedding_{category}", None)
-            if swipe.action == "like":
-                if category == CATEGORIES[0]:
-                    like_count += 1
-                _add_scaled(accumulator, source, 1.0)
-            elif swipe.action == "pass":
-                if category == CATEGORIES[0]:
-                    pass_count += 1
-                _add_scaled(accumulator, source, -0.35)
-        normalized = _normalize(accumulator)
-        if normalized:
-            vectors[category] = normalized
+    )
 
-    available = bool(vectors) and (like_count + pass_count) >= MIN_SIGNAL_SWIPES and like_count > 0
-    return {
-        "available": available,
-        "likeCount": like_count,
-        "passCount": pass_count,
-        "vectors": vectors,
-    }
+
+def reseed_swipe_preference_state(db: Session, user_id: uuid.UUID) -> None:
+    db.flush()
+    store_swipe_preference_state(db, seed_swipe_preference_state(db, user_id))
+
+
+def build_swipe_preference_model(db: Session, user_id: uuid.UUID, limit: int | None = None) -> dict[str, Any]:
+    return state_to_model(seed_swipe_preference_state(db, user_id, limit))
+
+
+def load_swipe_preference_model(db: Session, user_id: uuid.UUID) -> dict[str, Any]:
+    state = db.get(SwipePreferenceState, user_id)
+    if state is None:
+        return build_swipe_preference_model(db, user_id)
+    return state_to_model(state)
+
+
+def record_swipe_signal(
+    db: Session,
+    user_id: uuid.UUID,
+    target_user_id: uuid.UUID,
+    action: str,
+    previous_action: str | None = None,
+) -> None:
+    state = None if previous_action else db.get(SwipePreferenceState, user_id, with_for_update=True)
+    if state is None:
+        reseed_swipe_preference_state(db, user_id)
+        return
+    embedding = db.get(UserEmbedding, target_user_id, options=embedding_load_options())
+    apply_swipe_signal(state, embedding, action, datetime.now(timezone.utc))
+    count_swipe(state, action)
+
+
+def retract_swipe_signal(db: Session, user_id: uuid.UUID) -> None:
+    if db.get(SwipePreferenceState, user_id) is not None:
+        reseed_swipe_preference_state(db, user_id)
 
 
 def swipe_learning_score(model: dict[str, Any], candidate: UserEmbedding | None) -> dict[str, Any]:
     if not model.get("available") or not candidate or candidate.status != "ready":
         return {"available": False, "score": 0, "categoryScores": {}, "confidence": 0}
 
+    candidate_vectors = category_vectors(candidate)
     category_scores: dict[str, float] = {}
     total = 0.0
     count = 0
     for category, learned_vector in model.get("vectors", {}).items():
-        score = cosine_similarity(learned_vector, getattr(candidate, f"embedding_{category}", None))
+        score = cosine_similarity(learned_vector, candidate_vectors[category])
         normalized = max(0.0, min(1.0, (score + 1) / 2))
         category_scores[category] = round(normalized, 4)
         total += normalized
@@ -0,0 +1,35 @@
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import select  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.models import UserEmbedding  # noqa: E402
+from app.services.semantic_matching import combined_embedding  # noqa: E402
+
+BATCH_SIZE = 500
+
+
+def main() -> None:
+    updated = 0
+    last_user_id = None
+    with SessionLocal() as db:
+        while True:
+            query = select(UserEmbedding).where(UserEmbedding.status == "ready", UserEmbedding.embedding_combined.is_(None))
+            if last_user_id:
+                query = query.where(UserEmbedding.user_id > last_user_id)
+            rows = db.scalars(query.order_by(UserEmbedding.user_id).limit(BATCH_SIZE)).all()
+            if not rows:
+                break
+            for row in rows:
+                combined = combined_embedding(row)
+                row.embedding_combined = combined.tolist() if combined is not None else None
+            last_user_id = rows[-1].user_id
+            db.commit()
+            updated += len(rows)
+            print(f"backfilled {updated} embeddings")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from pathlib import Path
+import argparse
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database import SessionLocal  # noqa: E402
+from app.services.compatibility import compatibility_cities, compute_city  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Precompute top-N compatible candidates per user, city by city.")
+    parser.add_argument("--city", action="append", help="Only process this city (repeatable).")
+    parser.add_argument("--shard", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--full", action="store_true", help="Recompute every user instead of only changed source hashes.")
+    parser.add_argument("--top-n", type=int)
+    parser.add_argument("--block-size", type=int)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        cities = [city.strip().lower() for city in args.city] if args.city else compatibility_cities(db, args.shard, args.shards)
+        for city in cities:
+            processed = compute_city(db, city, full=args.full, top_n=args.top_n, block_size=args.block_size)
+            print(f"{city}: recomputed {processed} users")
+
+
+if __name__ == "__main__":
+    main()
@@ -65,7 +65,8 @@ os.environ["PORT"] = "7860"
 from app.config import get_settings  # noqa: E402
 from app.database import SessionLocal  # noqa: E402
 from app.models import UserEmbedding  # noqa: E402
-from app.services.semantic_matching import rebuild_user_embedding  # noqa: E402
+from app.services.embedding_jobs import process_embedding_jobs, start_embedding_job_worker  # noqa: E402
+from app.services.semantic_matching import rebuild_user_embedding, rebuild_user_embeddings  # noqa: E402
 
 
 def _check_token(worker_token: str):
@@ -93,6 +94,7 @@ def rebuild_profile(user_id: str, worker_token: str):
             "status": row.status,
             "model": row.model_name,
             "lastEmbeddedAt": row.last_embedded_at.isoformat() if row.last_embedded_at else None,
+            "rebuildReason": row.rebuild_reason,
             "error": row.error,
         }
 
@@ -100,21 +102,29 @@ def rebuild_profile(user_id: str, worker_token: str):
 @spaces.GPU(duration=120)
 def rebuild_missing(limit: int, worker_token: str):
     _check_token(worker_token)
-    safe_limit = max(1, min(int(limit), 25))
+    safe_limit = max(1, min(int(limit), 200))
     with SessionLocal() as db:
-        rows = db.scalars(
-            select(UserEmbedding)
+        user_ids = db.scalars(
+            select(UserEmbedding.user_id)
             .where(UserEmbedding.status.in_(["missing", "stale", "failed"]))
             .order_by(UserEmbedding.updated_at.asc())
             .limit(safe_limit)
         ).all()
-        results = []
-        for row in rows:
-            rebuilt = rebuild_user_embedding(db, row.user_id)
-            results.append({"userId": str(rebuilt.user_id), "status": rebuilt.status, "error": rebuilt.error})
+        rebuilt = rebuild_user_embeddings(db, list(user_ids))
+        results = [
+            {"userId": str(row.user_id), "status": row.status, "rebuildReason": row.rebuild_reason, "error": row.error}
+            for row in rebuilt
+        ]
         return {"success": True, "processed": len(results), "results": results}
 
 
+@spaces.GPU(duration=120)
+def process_jobs(limit: int, worker_token: str):
+    _check_token(worker_token)
+    with SessionLocal() as db:
+        return {"success": True, **process_embedding_jobs(db, max(1, min(int(limit), 200)))}
+
+
 with gr.Blocks(title="Flinder ML Worker") as demo:
     gr.Markdown("# Flinder ML Worker")
     with gr.Row():
@@ -128,9 +138,15 @@ with gr.Blocks(title="Flinder ML Worker") as demo:
     missing_button = gr.Button("Rebuild missing")
     missing_output = gr.JSON(label="Missing result")
     missing_button.click(rebuild_missing, [limit, token], missing_output, api_name="rebuild_missing")
+    jobs_button = gr.Button("Process queued jobs")
+    jobs_output = gr.JSON(label="Queue result")
+    jobs_button.click(process_jobs, [limit, token], jobs_output, api_name="process_jobs")
     gr.api(zero_gpu_probe, api_name="health")
 
 
+if get_settings().embedding_job_worker_enabled:
+    start_embedding_job_worker()
+
 demo.queue().launch(server_name="0.0.0.0", server_port=7860)
 '@ | Set-Content -Path (Join-Path $target "app.py") -Encoding utf8
 
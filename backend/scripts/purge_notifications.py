@@ -0,0 +1,20 @@
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.database import SessionLocal  # noqa: E402
+from app.services.notification_retention import purge_notifications  # noqa: E402
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        while True:
+            result = purge_notifications(db)
+            print(f"purged {result.notifications} notifications and {result.deliveries} deliveries in {result.batches} batches")
+            if result.complete:
+                break
+
+
+if __name__ == "__main__":
+    main()
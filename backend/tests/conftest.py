@@ -0,0 +1,97 @@
+from collections import defaultdict
+from contextlib import nullcontext
+
+import pytest
+
+
+class Rows(list):
+    def all(self):
+        return self
+
+    def one(self):
+        return self[0]
+
+
+def statement_table(statement) -> str:
+    table = getattr(statement, "table", None)
+    if table is not None:
+        return table.name
+    entity = statement.column_descriptions[0].get("entity")
+    return entity.__tablename__ if entity is not None else statement.get_final_froms()[0].name
+
+
+def statement_kind(statement) -> str:
+    for kind in ("insert", "update", "delete"):
+        if getattr(statement, f"is_{kind}", False):
+            return kind
+    return "select"
+
+
+def inserted_rows(statement, params=None) -> list[dict]:
+    if params is not None:
+        return list(params) if isinstance(params, (list, tuple)) else [params]
+    rows: dict[int, dict] = defaultdict(dict)
+    for key, value in statement.compile().params.items():
+        name, marker, index = key.rpartition("_m")
+        if marker and index.isdigit():
+            rows[int(index)][name] = value
+        else:
+            rows[0][key] = value
+    return [rows[index] for index in sorted(rows)]
+
+
+class FakeSession:
+    def __init__(self, **results):
+        self.results = results
+        self.queries: list[tuple[str, str]] = []
+        self.written: dict[str, list[dict]] = defaultdict(list)
+        self.commits = 0
+
+    def respond(self, statement, params=None) -> Rows:
+        table, kind = statement_table(statement), statement_kind(statement)
+        self.queries.append((kind, table))
+        if kind == "insert":
+            self.written[table].extend(inserted_rows(statement, params))
+        result = self.results.get(table, ())
+        return Rows(result(statement, params) if callable(result) else result)
+
+    def execute(self, statement, params=None):
+        return self.respond(statement, params)
+
+    def scalars(self, statement, params=None):
+        return self.respond(statement, params)
+
+    def scalar(self, statement, params=None):
+        rows = self.respond(statement, params)
+        return rows[0] if rows else None
+
+    def commit(self):
+        self.commits += 1
+
+    def begin_nested(self):
+        return nullcontext()
+
+
+class AsyncFakeSession(FakeSession):
+    async def execute(self, statement, params=None):
+        return self.respond(statement, params)
+
+    async def scalars(self, statement, params=None):
+        return self.respond(statement, params)
+
+    async def scalar(self, statement, params=None):
+        rows = self.respond(statement, params)
+        return rows[0] if rows else None
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession
+
+
+@pytest.fixture
+def async_fake_session():
+    return AsyncFakeSession
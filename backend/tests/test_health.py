@@ -39,3 +39,58 @@ def test_worker_only_app_exposes_internal_ml_without_public_routes(monkeypatch):
     monkeypatch.setenv("WORKER_ONLY", "false")
     get_settings.cache_clear()
     reload(main_module)
+
+
+def test_asgi_middleware_overhead_beats_base_http_middleware(record_property):
+    import asyncio
+    import time
+
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.responses import PlainTextResponse
+
+    from app.middleware import RateLimitMiddleware, RequestContextMiddleware
+    from app.services.rate_limit import MemoryRateLimitBackend
+
+    async def endpoint(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    class BaseHTTPRequestContext(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            response = await call_next(request)
+            response.headers["x-request-id"] = request.headers.get("x-request-id", "generated")
+            response.headers["x-content-type-options"] = "nosniff"
+            return response
+
+    class BaseHTTPPassThrough(BaseHTTPMiddleware):
+        async def dispatch(self, request, call_next):
+            return await call_next(request)
+
+    baseline = BaseHTTPRequestContext(BaseHTTPPassThrough(endpoint))
+    asgi = RequestContextMiddleware(RateLimitMiddleware(endpoint, backend=MemoryRateLimitBackend(10), rules=[]))
+    scope = {"type": "http", "method": "GET", "path": "/api/health", "headers": [], "query_string": b"", "client": ("127.0.0.1", 1)}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def per_request_us(app, requests=1500):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        started = time.perf_counter()
+        for _ in range(requests):
+            await app(dict(scope), receive, send)
+        start = next(message for message in messages if message["type"] == "http.response.start")
+        assert (b"x-content-type-options", b"nosniff") in start["headers"]
+        return (time.perf_counter() - started) / requests * 1e6
+
+    async def measure():
+        await per_request_us(baseline, 100)
+        await per_request_us(asgi, 100)
+        return min([await per_request_us(baseline) for _ in range(3)]), min([await per_request_us(asgi) for _ in range(3)])
+
+    before, after = asyncio.run(measure())
+    record_property("base_http_middleware_us", round(before, 1))
+    record_property("pure_asgi_middleware_us", round(after, 1))
+    assert after < before * 0.5, f"pure ASGI {after:.1f}us vs BaseHTTPMiddleware {before:.1f}us per request"
@@ -0,0 +1,24 @@
+-- pgvector storage for the weighted combined profile embedding used by discovery retrieval.
+-- Skipped with a notice when the vector extension cannot be installed; discovery then
+-- falls back to the in-process candidate index, so keep PGVECTOR_ENABLED=false on such databases.
+
+do $$
+begin
+  create extension if not exists vector;
+exception when others then
+  raise notice 'pgvector unavailable, skipping combined embedding column: %', sqlerrm;
+end
+$$;
+
+do $$
+begin
+  if exists (select 1 from pg_extension where extname = 'vector') then
+    alter table public.user_embeds
+    add column if not exists embedding_combined halfvec(2304);
+
+    create index if not exists user_embeds_combined_hnsw_idx
+    on public.user_embeds using hnsw (embedding_combined halfvec_ip_ops)
+    where status = 'ready';
+  end if;
+end
+$$;
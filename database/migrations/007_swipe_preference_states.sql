@@ -0,0 +1,21 @@
+-- Incrementally maintained swipe-learning accumulators, one row per swiper.
+
+create table if not exists public.swipe_preference_states (
+  user_id uuid primary key references public.users(id) on delete cascade,
+  accumulator_hobbies double precision[],
+  accumulator_interests double precision[],
+  accumulator_traits double precision[],
+  accumulator_personality double precision[],
+  accumulator_likes double precision[],
+  accumulator_dislikes double precision[],
+  like_count integer not null default 0 check (like_count >= 0),
+  pass_count integer not null default 0 check (pass_count >= 0),
+  decayed_at timestamptz,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+drop trigger if exists set_swipe_preference_states_updated_at on public.swipe_preference_states;
+create trigger set_swipe_preference_states_updated_at
+before update on public.swipe_preference_states
+for each row execute function public.set_updated_at();
@@ -0,0 +1,9 @@
+-- Content-addressed text embeddings shared by every profile rebuild.
+
+create table if not exists public.embedding_cache (
+  model_name text not null,
+  text_hash text not null,
+  embedding bytea not null,
+  created_at timestamptz not null default now(),
+  primary key (model_name, text_hash)
+);
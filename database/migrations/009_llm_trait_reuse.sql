@@ -0,0 +1,6 @@
+-- Track which profile source and prompt version produced the stored LLM traits.
+
+alter table public.user_embeds
+add column if not exists llm_source_hash text,
+add column if not exists llm_version text,
+add column if not exists rebuild_reason text;
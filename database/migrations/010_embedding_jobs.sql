@@ -0,0 +1,27 @@
+-- Durable queue of embedding rebuilds drained by the ML worker.
+
+create table if not exists public.embedding_jobs (
+  id uuid primary key default gen_random_uuid(),
+  user_id uuid not null references public.users(id) on delete cascade,
+  status text not null default 'pending'
+  check (status in ('pending', 'running', 'retry', 'done', 'dead')),
+  attempts integer not null default 0 check (attempts >= 0),
+  run_after timestamptz not null default now(),
+  locked_at timestamptz,
+  last_error text,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+create unique index if not exists embedding_jobs_pending_user_idx
+on public.embedding_jobs(user_id)
+where status = 'pending';
+
+create index if not exists embedding_jobs_claim_idx
+on public.embedding_jobs(status, run_after)
+where status in ('pending', 'retry', 'running');
+
+drop trigger if exists set_embedding_jobs_updated_at on public.embedding_jobs;
+create trigger set_embedding_jobs_updated_at
+before update on public.embedding_jobs
+for each row execute function public.set_updated_at();
@@ -0,0 +1,4 @@
+-- Compact float16/int8 copy of the six category embeddings.
+
+alter table public.user_embeds
+add column if not exists embedding_packed bytea;
@@ -0,0 +1,14 @@
+-- Expression indexes backing the discovery hard filters.
+
+create index if not exists profiles_city_lower_idx on public.profiles (lower(city));
+
+create index if not exists profiles_budget_range_idx on public.profiles (
+  (case when jsonb_typeof(budget->'min') = 'number' then (budget->>'min')::numeric end),
+  (case when jsonb_typeof(budget->'max') = 'number' then (budget->>'max')::numeric end)
+);
+
+create index if not exists profiles_room_preference_idx on public.profiles (room_preference);
+
+create index if not exists preferences_hidden_idx
+on public.preferences (user_id)
+where (discovery_settings->>'showMeToOthers')::boolean is false;
@@ -0,0 +1,26 @@
+-- Optional earthdistance indexes for GEO_BACKEND=earthdistance radius search.
+-- Skipped with a notice when the cube/earthdistance extensions cannot be installed;
+-- keep GEO_BACKEND=haversine on such databases.
+
+do $$
+begin
+  create extension if not exists cube;
+  create extension if not exists earthdistance;
+exception when others then
+  raise notice 'earthdistance unavailable, skipping geo indexes: %', sqlerrm;
+end
+$$;
+
+do $$
+begin
+  if exists (select 1 from pg_extension where extname = 'earthdistance') then
+    create index if not exists profiles_earth_idx
+    on public.profiles using gist (ll_to_earth(latitude, longitude))
+    where latitude is not null and longitude is not null;
+
+    create index if not exists flats_earth_idx
+    on public.flats using gist (ll_to_earth(latitude, longitude))
+    where latitude is not null and longitude is not null and status = 'active';
+  end if;
+end
+$$;
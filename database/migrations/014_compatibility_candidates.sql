@@ -0,0 +1,34 @@
+-- Offline top-N compatible candidates per user, computed city by city.
+
+create table if not exists public.compatibility_candidates (
+  user_id uuid not null references public.users(id) on delete cascade,
+  candidate_id uuid not null references public.users(id) on delete cascade,
+  city text not null,
+  score integer not null,
+  semantic_score integer not null default 0,
+  source_hash text,
+  computed_at timestamptz not null default now(),
+  primary key (user_id, candidate_id)
+);
+
+create index if not exists compatibility_candidates_rank_idx
+on public.compatibility_candidates(user_id, score desc);
+
+create index if not exists compatibility_candidates_city_idx
+on public.compatibility_candidates(city, user_id);
+
+create table if not exists public.compatibility_job_state (
+  city text primary key,
+  status text not null default 'running' check (status in ('running', 'done')),
+  mode text not null default 'incremental' check (mode in ('incremental', 'full')),
+  cursor_user_id uuid,
+  processed integer not null default 0,
+  started_at timestamptz not null default now(),
+  finished_at timestamptz,
+  updated_at timestamptz not null default now()
+);
+
+drop trigger if exists set_compatibility_job_state_updated_at on public.compatibility_job_state;
+create trigger set_compatibility_job_state_updated_at
+before update on public.compatibility_job_state
+for each row execute function public.set_updated_at();
@@ -0,0 +1,3 @@
+-- Tokens issued before this timestamp are rejected (set on logout).
+
+alter table public.users add column if not exists sessions_valid_after timestamptz;
@@ -0,0 +1,10 @@
+-- GCRA rate-limit state shared by every API worker. One row per limited key;
+-- tat is the theoretical arrival time in epoch seconds. Unlogged because losing
+-- it on a crash only resets limits.
+
+create unlogged table if not exists public.rate_limit_buckets (
+  key text primary key,
+  tat double precision not null
+);
+
+create index if not exists rate_limit_buckets_tat_idx on public.rate_limit_buckets (tat);
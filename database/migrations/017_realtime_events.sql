@@ -0,0 +1,10 @@
+-- Spill table for realtime events too large for a NOTIFY payload (8000 bytes).
+-- Rows are only needed for a few seconds and are pruned by the publisher.
+
+create unlogged table if not exists public.realtime_events (
+  id bigserial primary key,
+  payload jsonb not null,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists realtime_events_created_at_idx on public.realtime_events (created_at);
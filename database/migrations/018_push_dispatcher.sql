@@ -0,0 +1,13 @@
+-- Push deliveries are queued as pending rows and drained by the background dispatcher.
+
+alter table public.notification_deliveries add column if not exists attempts integer not null default 0;
+alter table public.notification_deliveries add column if not exists run_after timestamptz not null default now();
+alter table public.notification_deliveries add column if not exists locked_at timestamptz;
+
+alter table public.notification_deliveries drop constraint if exists notification_deliveries_status_check;
+alter table public.notification_deliveries add constraint notification_deliveries_status_check
+check (status in ('pending', 'sending', 'sent', 'failed', 'skipped'));
+
+create index if not exists notification_deliveries_claim_idx
+on public.notification_deliveries(run_after)
+where status in ('pending', 'sending');
@@ -0,0 +1,8 @@
+-- Chat bursts update one unread notification per conversation instead of inserting one per message.
+
+alter table public.notifications add column if not exists coalesce_key text;
+alter table public.notifications add column if not exists coalesced_count integer not null default 1;
+
+create index if not exists notifications_coalesce_idx
+on public.notifications(user_id, coalesce_key, created_at desc)
+where not is_read and coalesce_key is not null;
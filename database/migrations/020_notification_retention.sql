@@ -0,0 +1,16 @@
+-- Expired notifications and finished push deliveries are purged in small batches.
+
+create index if not exists notifications_expire_at_idx
+on public.notifications(expire_at)
+where expire_at is not null;
+
+create index if not exists notifications_unexpiring_created_at_idx
+on public.notifications(created_at)
+where expire_at is null;
+
+create index if not exists notification_deliveries_finished_created_at_idx
+on public.notification_deliveries(created_at)
+where status in ('sent', 'failed', 'skipped');
+
+alter table public.notifications set (autovacuum_vacuum_scale_factor = 0.05, autovacuum_analyze_scale_factor = 0.02);
+alter table public.notification_deliveries set (autovacuum_vacuum_scale_factor = 0.05, autovacuum_analyze_scale_factor = 0.02);
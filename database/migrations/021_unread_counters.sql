@@ -0,0 +1,30 @@
+-- Unread badges are maintained counters instead of scans over notifications and messages.
+
+create table if not exists public.user_badges (
+  user_id uuid primary key references public.users(id) on delete cascade,
+  unread_notifications integer not null default 0 check (unread_notifications >= 0),
+  updated_at timestamptz not null default now()
+);
+
+alter table public.chat_members add column if not exists unread_count integer not null default 0;
+
+insert into public.user_badges (user_id, unread_notifications)
+select user_id, count(*)
+from public.notifications
+where not is_read
+group by user_id
+on conflict (user_id) do update set unread_notifications = excluded.unread_notifications, updated_at = now();
+
+update public.chat_members member
+set unread_count = unread.total
+from (
+  select chat_members.id, count(messages.id) as total
+  from public.chat_members
+  join public.messages
+    on messages.chat_id = chat_members.chat_id
+   and messages.sender_id <> chat_members.user_id
+   and not messages.is_read
+   and not messages.is_deleted
+  group by chat_members.id
+) unread
+where member.id = unread.id;
@@ -0,0 +1,18 @@
+-- One queued (pending or retry) embedding job per user, and an index for purging finished jobs.
+
+delete from public.embedding_jobs job
+using public.embedding_jobs other
+where job.user_id = other.user_id
+  and job.status in ('pending', 'retry')
+  and other.status in ('pending', 'retry')
+  and (job.status, job.created_at, job.id) > (other.status, other.created_at, other.id);
+
+drop index if exists public.embedding_jobs_pending_user_idx;
+
+create unique index if not exists embedding_jobs_queued_user_idx
+on public.embedding_jobs(user_id)
+where status in ('pending', 'retry');
+
+create index if not exists embedding_jobs_done_idx
+on public.embedding_jobs(updated_at)
+where status = 'done';
@@ -0,0 +1,26 @@
+-- Deleted embedding rows leave a tombstone so the in-process candidate index can prune incrementally.
+
+create table if not exists public.user_embed_tombstones (
+  user_id uuid primary key,
+  deleted_at timestamptz not null default now()
+);
+
+create index if not exists user_embed_tombstones_deleted_at_idx
+on public.user_embed_tombstones(deleted_at);
+
+create or replace function public.record_user_embed_tombstone()
+returns trigger
+language plpgsql
+as $$
+begin
+  insert into public.user_embed_tombstones (user_id, deleted_at)
+  values (old.user_id, now())
+  on conflict (user_id) do update set deleted_at = excluded.deleted_at;
+  return old;
+end;
+$$;
+
+drop trigger if exists record_user_embed_tombstone on public.user_embeds;
+create trigger record_user_embed_tombstone
+after delete on public.user_embeds
+for each row execute function public.record_user_embed_tombstone();
@@ -0,0 +1,3 @@
+-- Compatibility runs persist the users they still have to recompute so a resumed run skips finished users.
+
+alter table public.compatibility_job_state add column if not exists pending_user_ids uuid[];